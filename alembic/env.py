@@ -3,7 +3,13 @@ from sqlalchemy import create_engine
 from sqlalchemy import pool
 from alembic import context
 
-from backend.database import Base, DATABASE_URL
+import os
+import sys
+
+# The backend modules import each other by flat name (they run from backend/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from database import Base, DATABASE_URL
 
 config = context.config
 
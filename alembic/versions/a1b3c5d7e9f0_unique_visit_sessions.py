@@ -0,0 +1,32 @@
+# alembic/versions/a1b3c5d7e9f0_unique_visit_sessions.py
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+# Numbers each visitor's sessions (seq) and makes (site_id, session_key, seq)
+# unique, so two workers can't both open a session for the same tab at once.
+revision = "a1b3c5d7e9f0"
+down_revision = "f6a4b8c0d234"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("visit_sessions", sa.Column("seq", sa.Integer(), nullable=False, server_default="0"))
+
+    # Existing sessions of one visitor get 0, 1, 2... in start order
+    op.execute("""
+        UPDATE visit_sessions SET seq = (
+            SELECT r.rn FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY site_id, session_key ORDER BY started_at, id) - 1 AS rn
+                FROM visit_sessions
+            ) r
+            WHERE r.id = visit_sessions.id
+        )
+    """)
+
+    op.create_index("uix_visit_sessions_site_key_seq", "visit_sessions", ["site_id", "session_key", "seq"], unique=True)
+
+def downgrade():
+    op.drop_index("uix_visit_sessions_site_key_seq", table_name="visit_sessions")
+    op.drop_column("visit_sessions", "seq")
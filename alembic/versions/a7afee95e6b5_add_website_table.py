@@ -13,6 +13,9 @@ branch_labels = None
 depends_on = None
 
 def upgrade():
+    # Skip it if an earlier setup already created the table
+    if 'website' in sa.inspect(op.get_bind()).get_table_names():
+        return
     # ### commands auto generated by Alembic - please adjust! ###
     op.create_table(
         'website',
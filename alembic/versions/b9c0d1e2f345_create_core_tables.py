@@ -0,0 +1,62 @@
+# alembic/versions/b9c0d1e2f345_create_core_tables.py
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+# Creates the tables that used to come from Base.metadata.create_all() at app
+# startup, as they were before the sessionization/referrer/shard migrations.
+# Databases that already have them (created by the old startup code) are left alone.
+revision = "b9c0d1e2f345"
+down_revision = "a7afee95e6b5"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "websites" not in existing:
+        op.create_table(
+            "websites",
+            sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True, nullable=False),
+            sa.Column("name", sa.String(), nullable=True),
+            sa.Column("domain", sa.String(), nullable=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        )
+
+    if "events" not in existing:
+        op.create_table(
+            "events",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("site_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("websites.id", ondelete="CASCADE"), nullable=True),
+            sa.Column("page", sa.String(), nullable=True),
+            sa.Column("element", sa.String(), nullable=True),
+            sa.Column("text", sa.String(), nullable=True),
+            sa.Column("href", sa.String(), nullable=True),
+            sa.Column("event_type", sa.String(), nullable=True),
+            sa.Column("timestamp", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("referrer", sa.String(), nullable=True),
+        )
+        op.create_index("ix_events_id", "events", ["id"])
+        op.create_index("ix_events_site_id", "events", ["site_id"])
+
+    for table, constraint in (("event_labels", "uix_event_label"), ("ignored_events", "uix_ignored_event")):
+        if table in existing:
+            continue
+        columns = [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("site_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("websites.id", ondelete="CASCADE"), nullable=True),
+            sa.Column("element", sa.String(), nullable=False),
+            sa.Column("original_text", sa.String(), nullable=False),
+        ]
+        if table == "event_labels":
+            columns.append(sa.Column("custom_text", sa.String(), nullable=True))
+        op.create_table(table, *columns, sa.UniqueConstraint("site_id", "element", "original_text", name=constraint))
+        op.create_index(f"ix_{table}_id", table, ["id"])
+        op.create_index(f"ix_{table}_site_id", table, ["site_id"])
+
+def downgrade():
+    # The tables may predate this revision, so downgrading leaves them in place
+    pass
@@ -0,0 +1,39 @@
+# alembic/versions/c3d1e5f7a901_add_visit_sessions.py
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+# Adds the per-event session key and the incrementally maintained visit_sessions table.
+revision = "c3d1e5f7a901"
+down_revision = "b9c0d1e2f345"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("events", sa.Column("session_id", sa.String(), nullable=True))
+
+    op.create_table(
+        "visit_sessions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("site_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("websites.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("session_key", sa.String(), nullable=False),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_seen_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("entry_page", sa.String(), nullable=True),
+        sa.Column("exit_page", sa.String(), nullable=True),
+        sa.Column("page_views", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("click_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("steps", sa.JSON(), nullable=False),
+    )
+    op.create_index("ix_visit_sessions_id", "visit_sessions", ["id"])
+    op.create_index("ix_visit_sessions_site_key_seen", "visit_sessions", ["site_id", "session_key", "last_seen_at"])
+    op.create_index("ix_visit_sessions_site_started", "visit_sessions", ["site_id", "started_at"])
+
+def downgrade():
+    op.drop_index("ix_visit_sessions_site_started", table_name="visit_sessions")
+    op.drop_index("ix_visit_sessions_site_key_seen", table_name="visit_sessions")
+    op.drop_index("ix_visit_sessions_id", table_name="visit_sessions")
+    op.drop_table("visit_sessions")
+    op.drop_column("events", "session_id")
@@ -9,6 +9,9 @@ branch_labels = None
 depends_on = None
 
 def upgrade():
+    # Databases created by the old startup create_all() already have it
+    if "users" in sa.inspect(op.get_bind()).get_table_names():
+        return
     op.create_table(
         "users",
         sa.Column("id", sa.Integer, primary_key=True),
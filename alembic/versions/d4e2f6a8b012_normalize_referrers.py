@@ -0,0 +1,62 @@
+# alembic/versions/d4e2f6a8b012_normalize_referrers.py
+
+from alembic import op
+import sqlalchemy as sa
+
+from backend.referrers import normalize_referrer
+
+# revision identifiers, used by Alembic.
+# Adds ingest-time referrer normalization columns, backfills them, and indexes
+# the columns behind /stats/pages and /stats/referrers.
+revision = "d4e2f6a8b012"
+down_revision = "c3d1e5f7a901"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 5000
+
+def upgrade():
+    op.add_column("events", sa.Column("referrer_host", sa.String(), nullable=True))
+    op.add_column("events", sa.Column("referrer_source", sa.String(), nullable=True))
+
+    # Backfill existing rows in id-ordered batches using the same normalizer as ingest
+    conn = op.get_bind()
+    events = sa.table(
+        "events",
+        sa.column("id", sa.Integer),
+        sa.column("referrer", sa.String),
+        sa.column("referrer_host", sa.String),
+        sa.column("referrer_source", sa.String),
+    )
+    update = (
+        events.update()
+        .where(events.c.id == sa.bindparam("_id"))
+        .values(referrer_host=sa.bindparam("_host"), referrer_source=sa.bindparam("_source"))
+    )
+
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(events.c.id, events.c.referrer)
+            .where(events.c.id > last_id)
+            .order_by(events.c.id)
+            .limit(BACKFILL_BATCH)
+        ).fetchall()
+        if not rows:
+            break
+
+        params = []
+        for row in rows:
+            host, source = normalize_referrer(row.referrer)
+            params.append({"_id": row.id, "_host": host, "_source": source})
+        conn.execute(update, params)
+        last_id = rows[-1].id
+
+    op.create_index("ix_events_site_type_page", "events", ["site_id", "event_type", "page"])
+    op.create_index("ix_events_site_type_source", "events", ["site_id", "event_type", "referrer_source"])
+
+def downgrade():
+    op.drop_index("ix_events_site_type_source", table_name="events")
+    op.drop_index("ix_events_site_type_page", table_name="events")
+    op.drop_column("events", "referrer_source")
+    op.drop_column("events", "referrer_host")
@@ -0,0 +1,27 @@
+# alembic/versions/e5f3a7b9c123_shard_events_by_site.py
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+# Records each website's event shard and drops the events -> websites foreign keys,
+# since a site's events may now live in a different database (see backend/shards.py).
+revision = "e5f3a7b9c123"
+down_revision = "d4e2f6a8b012"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("websites", sa.Column("shard", sa.String(), nullable=True))
+
+    # Postgres default names for the constraints create_all / c3d1e5f7a901 created
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("ALTER TABLE events DROP CONSTRAINT IF EXISTS events_site_id_fkey")
+        op.execute("ALTER TABLE visit_sessions DROP CONSTRAINT IF EXISTS visit_sessions_site_id_fkey")
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.create_foreign_key("visit_sessions_site_id_fkey", "visit_sessions", "websites", ["site_id"], ["id"], ondelete="CASCADE")
+        op.create_foreign_key("events_site_id_fkey", "events", "websites", ["site_id"], ["id"], ondelete="CASCADE")
+
+    op.drop_column("websites", "shard")
@@ -0,0 +1,20 @@
+# alembic/versions/f6a4b8c0d234_add_event_ids.py
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+# Adds the optional client event id and the unique index that makes /track retries idempotent.
+# A unique index rather than a constraint so it also works on SQLite.
+revision = "f6a4b8c0d234"
+down_revision = "e5f3a7b9c123"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("events", sa.Column("event_id", sa.String(), nullable=True))
+    op.create_index("uix_events_site_event_id", "events", ["site_id", "event_id"], unique=True)
+
+def downgrade():
+    op.drop_index("uix_events_site_event_id", table_name="events")
+    op.drop_column("events", "event_id")
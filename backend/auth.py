@@ -6,7 +6,7 @@ from passlib.context import CryptContext
 import secrets
 
 from models import User
-from database import get_db
+from database import SessionLocal, get_db
 
 router = APIRouter()
 
@@ -16,10 +16,7 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 sessions = {}
 
 
-def get_current_user(
-    request: Request,
-    db=Depends(get_db)
-):
+def get_current_user(request: Request):
     token = request.cookies.get("session_token")
     if not token:
         raise HTTPException(status_code=401, detail="Not logged in")
@@ -28,7 +25,13 @@ def get_current_user(
     if not user_id:
         raise HTTPException(status_code=401, detail="Not logged in")
 
-    user = db.query(User).get(user_id)
+    # Own short-lived session: a request-scoped one would hold a primary
+    # connection through the whole route, on top of the one a report reads with
+    db = SessionLocal()
+    try:
+        user = db.query(User).get(user_id)
+    finally:
+        db.close()
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
 
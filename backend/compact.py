@@ -0,0 +1,77 @@
+# backend/compact.py
+#
+# Helpers for the compact /stats payload (?format=compact) and fast JSON responses.
+#
+# Row lists like all_clicks repeat the same keys and mostly the same few
+# strings (element, page, referrer) thousands of times. The compact form sends
+# them as column arrays instead, with strings replaced by indexes into one
+# shared "strings" table and timestamps as epoch milliseconds. dashboard.js
+# turns them back into row objects.
+
+import json
+from datetime import datetime
+
+from fastapi.responses import Response
+
+from sessionization import as_utc
+
+# orjson is several times faster than the stdlib encoder but optional
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """
+    JSONResponse that skips FastAPI's jsonable_encoder pass and uses orjson when
+    installed. Content must already be plain JSON types.
+    """
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class StringTable:
+    """Dictionary-encodes strings: each distinct value is sent once, rows carry its index."""
+
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def encode(self, value):
+        if value is None:
+            return None
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+
+def epoch_ms(dt: datetime):
+    if dt is None:
+        return None
+    return int(as_utc(dt).timestamp() * 1000)
+
+
+def encode_columns(rows, string_columns, timestamp_column, strings: StringTable):
+    """
+    rows are (string values..., timestamp) tuples in the order of string_columns.
+    Returns {column: [values]} with strings as indexes into strings.values.
+    """
+    columns = {name: [] for name in string_columns}
+    timestamps = []
+    for row in rows:
+        for name, value in zip(string_columns, row):
+            columns[name].append(strings.encode(value))
+        timestamps.append(epoch_ms(row[len(string_columns)]))
+    columns[timestamp_column] = timestamps
+    return columns
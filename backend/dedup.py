@@ -0,0 +1,65 @@
+# backend/dedup.py
+#
+# Cheap replay filter for /track. Snippet retries resend the same client
+# event_id, so this remembers recently stored (site_id, event_id) keys in
+# time buckets and lets the route drop a replay without touching the database.
+#
+# It's per worker process and only covers DEDUP_WINDOW_SECONDS, so it is a
+# fast path, not the guarantee: the unique index on events (site_id, event_id)
+# catches whatever slips past it (other workers, restarts, older replays).
+
+import hashlib
+import threading
+import time
+from collections import deque
+
+from config import DEDUP_WINDOW_SECONDS, DEDUP_MAX_KEYS
+
+# Window is split into this many buckets; the oldest one is dropped as a whole
+DEDUP_BUCKETS = 10
+
+
+class DedupWindow:
+    def __init__(self, window_seconds: float, max_keys: int, buckets: int = DEDUP_BUCKETS):
+        self.bucket_seconds = max(window_seconds / buckets, 0.001)
+        self.buckets = buckets
+        self.max_keys = max_keys
+        self._ring = deque()  # (bucket number, set of digests), oldest first
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(site_id, event_id):
+        # Fixed 16 bytes per key no matter how long the client's id is
+        return hashlib.blake2b(f"{site_id}:{event_id}".encode(), digest_size=16).digest()
+
+    def _evict(self, now_bucket):
+        while self._ring and (self._ring[0][0] <= now_bucket - self.buckets or self._size > self.max_keys):
+            _, keys = self._ring.popleft()
+            self._size -= len(keys)
+
+    def seen(self, site_id, event_id) -> bool:
+        """True if this key was stored within the window."""
+        key = self._digest(site_id, event_id)
+        with self._lock:
+            self._evict(int(time.monotonic() / self.bucket_seconds))
+            return any(key in keys for _, keys in self._ring)
+
+    def add(self, site_id, event_id):
+        """Remember a key. Call only after the event is committed, so a failed write can be retried."""
+        key = self._digest(site_id, event_id)
+        now_bucket = int(time.monotonic() / self.bucket_seconds)
+        with self._lock:
+            if not self._ring or self._ring[-1][0] != now_bucket:
+                self._ring.append((now_bucket, set()))
+            keys = self._ring[-1][1]
+            if key not in keys:
+                keys.add(key)
+                self._size += 1
+            self._evict(now_bucket)
+
+    def __len__(self):
+        return self._size
+
+
+recent_events = DedupWindow(DEDUP_WINDOW_SECONDS, DEDUP_MAX_KEYS)
@@ -0,0 +1,429 @@
+# backend/import_events.py
+#
+# Bulk loads historical events from files, bypassing /track.
+#
+#   python import_events.py export.csv --site-id <uuid>
+#   python import_events.py old_tool.ndjson --map-file sites.csv --workers 8
+#
+# Input is CSV (the /stats/export/csv format, optionally with site_id,
+# session_id and event_id columns) or NDJSON with the same keys as the
+# /track payload. Rows are read in chunks and loaded by a pool of worker
+# processes straight into each site's shard: COPY on Postgres (psycopg2),
+# batched executemany with other Postgres drivers and on SQLite. Other
+# databases are refused up front, since the loader relies on ON CONFLICT.
+#
+# Every row gets an event_id derived from its contents (unless the file has
+# one), and rows whose (site_id, event_id) already exists are skipped. So a
+# file, or a copy of it under another name, can be loaded any number of times
+# and each event is stored once. Rows that are identical in every field are
+# told apart by how many times the row already appeared earlier in the same
+# file, so genuine repeats (two page views in the same second) all load. The
+# parent process counts them, keeping one small entry per distinct row of the
+# file being read.
+#
+# Progress is checkpointed per chunk, so re-running the same command after a
+# crash skips finished chunks; a chunk that was half written just has its
+# already-stored rows skipped.
+#
+# Imported events don't go through sessionization, so they show up in stats
+# and exports but not in funnels.
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from uuid import UUID as py_UUID
+
+from database import SessionLocal, engine
+from models import Website
+from referrers import normalize_referrer
+from sessionization import as_utc
+from shards import SHARDS, insert_new_events, shard_name
+
+# Columns written by the loader, in COPY order
+COLUMNS = [
+    "site_id", "event_type", "page", "element", "text", "href", "timestamp",
+    "referrer", "referrer_host", "referrer_source", "session_id", "event_id",
+]
+
+# Fields that identify an event when the file doesn't carry an event_id
+IDENTITY_FIELDS = ["event_type", "timestamp", "page", "element", "text", "href", "referrer", "session_id"]
+
+# Set in each worker process by _init_worker
+_site_shards = {}
+_site_map = {}
+
+
+# --- Reading -----------------------------------------------------------------
+
+def detect_format(path):
+    name = path.lower()
+    if name.endswith((".ndjson", ".jsonl", ".json")):
+        return "ndjson"
+    if name.endswith(".csv"):
+        return "csv"
+    raise SystemExit(f"Can't tell the format of '{path}'; pass --format csv or --format ndjson")
+
+
+def read_rows(path, fmt):
+    """Yields raw dicts from a CSV or NDJSON file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def read_chunks(path, fmt, chunk_size):
+    chunk = []
+    for row in read_rows(path, fmt):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def file_tag(path):
+    """Identifies a file (path, size, mtime) for its checkpoint entry."""
+    stat = os.stat(path)
+    return hashlib.sha1(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:12]
+
+
+# --- Validation --------------------------------------------------------------
+
+def _text(value):
+    # Empty CSV cells become NULL, same as fields the snippet leaves out
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def parse_timestamp(value):
+    value = _text(value)
+    if not value:
+        return None
+    try:
+        return as_utc(datetime.fromisoformat(value.replace("Z", "+00:00")))
+    except ValueError:
+        return None
+
+
+def row_identity(raw, default_site, site_map):
+    """Short digest of a raw row's identifying fields, for counting repeats within a file."""
+    site_text = _text(raw.get("site_id")) or default_site or ""
+    parts = [site_map.get(site_text, site_text), _text(raw.get("id")) or ""]
+    parts += [_text(raw.get(f)) or "" for f in IDENTITY_FIELDS]
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=8).digest()
+
+
+def content_event_id(site_id, row, source_id, occurrence):
+    """Same event, same id: whichever file, copy or run it is loaded from."""
+    parts = [str(site_id), _text(source_id) or ""]
+    parts += [row[f].isoformat() if f == "timestamp" else (row[f] or "") for f in IDENTITY_FIELDS]
+    if occurrence:
+        parts.append(str(occurrence))
+    return "import:" + hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:24]
+
+
+def prepare_row(raw, default_site, occurrence=0):
+    """
+    Turns one raw row into a column dict for COLUMNS, or returns (None, reason)
+    when it can't be loaded. occurrence counts identical rows earlier in the file.
+    """
+    site_text = _text(raw.get("site_id")) or default_site
+    if not site_text:
+        return None, "missing site_id"
+    site_text = _site_map.get(site_text, site_text)
+    try:
+        site_id = py_UUID(site_text)
+    except ValueError:
+        return None, f"invalid site_id '{site_text}'"
+    if site_id not in _site_shards:
+        return None, f"unknown site_id '{site_id}'"
+
+    event_type = _text(raw.get("event_type"))
+    if not event_type:
+        return None, "missing event_type"
+    timestamp = parse_timestamp(raw.get("timestamp"))
+    if timestamp is None:
+        return None, f"invalid timestamp '{raw.get('timestamp')}'"
+
+    referrer = _text(raw.get("referrer"))
+    referrer_host, referrer_source = normalize_referrer(referrer)
+
+    row = {
+        "site_id": site_id,
+        "event_type": event_type,
+        "page": _text(raw.get("page")),
+        "element": _text(raw.get("element")),
+        "text": _text(raw.get("text")),
+        "href": _text(raw.get("href")),
+        "timestamp": timestamp,
+        "referrer": referrer,
+        "referrer_host": referrer_host,
+        "referrer_source": referrer_source,
+        "session_id": _text(raw.get("session_id")),
+    }
+    # The export's "id" column tells apart events that are otherwise identical
+    row["event_id"] = _text(raw.get("event_id")) or content_event_id(site_id, row, raw.get("id"), occurrence)
+    return row, None
+
+
+# --- Loading -----------------------------------------------------------------
+
+def _init_worker(site_shards, site_map):
+    global _site_shards, _site_map
+    _site_shards = site_shards
+    _site_map = site_map
+    # Connections inherited from the parent over fork must not be reused here
+    engine.dispose(close=False)
+    for shard in SHARDS.values():
+        shard.ingest_engine.dispose(close=False)
+
+
+def copy_rows(shard_engine, rows):
+    """
+    Postgres: COPY into a temp table, then move the rows over skipping any
+    (site_id, event_id) already stored. Returns the number inserted.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([
+            row["timestamp"].isoformat() if c == "timestamp" else row[c]
+            for c in COLUMNS
+        ])
+    buf.seek(0)
+
+    columns = ", ".join(COLUMNS)
+    raw = shard_engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(f"CREATE TEMP TABLE import_events ON COMMIT DROP AS SELECT {columns} FROM events WITH NO DATA")
+        cursor.copy_expert(f"COPY import_events ({columns}) FROM STDIN WITH (FORMAT csv)", buf)
+        cursor.execute(
+            f"INSERT INTO events ({columns}) SELECT {columns} FROM import_events "
+            "ON CONFLICT (site_id, event_id) DO NOTHING"
+        )
+        inserted = cursor.rowcount
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    return inserted
+
+
+def insert_rows(shard_engine, rows, batch_size):
+    """Batched executemany that skips rows already stored. Returns the number inserted."""
+    insert = insert_new_events(shard_engine)
+    inserted = 0
+    with shard_engine.begin() as conn:
+        for i in range(0, len(rows), batch_size):
+            inserted += conn.execute(insert, rows[i:i + batch_size]).rowcount
+    return inserted
+
+
+def load_chunk(path, chunk_no, first_row, raw_rows, occurrences, default_site, batch_size):
+    """Runs in a worker. Returns (path, chunk_no, loaded, duplicates, rejected, sample errors)."""
+    by_shard = {}
+    rejected = 0
+    errors = []
+    for offset, (raw, occurrence) in enumerate(zip(raw_rows, occurrences)):
+        row, reason = prepare_row(raw, default_site, occurrence)
+        if row is None:
+            rejected += 1
+            if len(errors) < 3:
+                errors.append(f"row {first_row + offset}: {reason}")
+            continue
+        by_shard.setdefault(_site_shards[row["site_id"]], []).append(row)
+
+    loaded = duplicates = 0
+    for name, rows in by_shard.items():
+        shard_engine = SHARDS[name].ingest_engine
+        if shard_engine.dialect.driver == "psycopg2":
+            inserted = copy_rows(shard_engine, rows)
+        else:
+            inserted = insert_rows(shard_engine, rows, batch_size)
+        loaded += inserted
+        duplicates += len(rows) - inserted
+
+    return path, chunk_no, loaded, duplicates, rejected, errors
+
+
+# --- Checkpoints ---------------------------------------------------------------
+
+def load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"files": {}}
+
+
+def save_checkpoint(path, state):
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+# --- Main ----------------------------------------------------------------------
+
+def load_site_map(pairs, map_file):
+    """Source-tool site id -> our Website.id (as strings)."""
+    site_map = {}
+    if map_file:
+        with open(map_file, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                if len(row) >= 2 and row[0].strip() and not row[0].startswith("#"):
+                    site_map[row[0].strip()] = row[1].strip()
+    for pair in pairs or []:
+        source, sep, target = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"Invalid --map '{pair}'. Expected old_id=new_site_id.")
+        site_map[source.strip()] = target.strip()
+    return site_map
+
+
+def load_site_shards():
+    db = SessionLocal()
+    try:
+        return {w.id: shard_name(w) for w in db.query(Website.id, Website.shard)}
+    finally:
+        db.close()
+
+
+def import_files(paths, fmt=None, default_site=None, site_map=None, workers=4,
+                 chunk_size=20000, batch_size=5000, checkpoint_path=None):
+    for shard in SHARDS.values():
+        try:
+            insert_new_events(shard.ingest_engine)
+        except ValueError as e:
+            raise SystemExit(f"Shard '{shard.name}': {e}")
+
+    site_shards = load_site_shards()
+    site_map = site_map or {}
+
+    # Fail fast on mappings that point nowhere instead of rejecting every row
+    for target in {default_site, *site_map.values()} - {None}:
+        try:
+            known = py_UUID(target) in site_shards
+        except ValueError:
+            known = False
+        if not known:
+            raise SystemExit(f"Website {target} not found")
+
+    state = load_checkpoint(checkpoint_path)
+    totals = {"loaded": 0, "duplicates": 0, "rejected": 0, "failed_chunks": 0}
+    started = time.perf_counter()
+
+    def report(done):
+        path, chunk_no, loaded, duplicates, rejected, errors = done
+        totals["loaded"] += loaded
+        totals["duplicates"] += duplicates
+        totals["rejected"] += rejected
+        progress = state["files"][path]
+        progress["done"].append(chunk_no)
+        save_checkpoint(checkpoint_path, state)
+        for error in errors:
+            print(f"  {os.path.basename(path)} {error}")
+        elapsed = time.perf_counter() - started
+        print(f"{totals['loaded']:>12,} rows loaded, {totals['duplicates']:,} already stored, {totals['rejected']:,} rejected  ({totals['loaded'] / max(elapsed, 1e-9):,.0f} rows/s)")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(site_shards, site_map)) as pool:
+        pending = {}
+
+        def drain(block_until):
+            done, _ = wait(pending, return_when=FIRST_COMPLETED) if len(pending) >= block_until else (set(), None)
+            for future in done:
+                path, chunk_no = pending.pop(future)
+                try:
+                    report(future.result())
+                except Exception as e:
+                    totals["failed_chunks"] += 1
+                    print(f"  {os.path.basename(path)} chunk {chunk_no} failed: {e}")
+
+        for path in map(os.path.abspath, paths):
+            tag = file_tag(path)
+            progress = state["files"].get(path)
+            if progress and (progress["tag"] != tag or progress["chunk_size"] != chunk_size):
+                raise SystemExit(f"'{path}' changed (or --chunk-size did) since the checkpoint; delete {checkpoint_path} to start over")
+            resuming = progress is not None
+            if not resuming:
+                progress = state["files"][path] = {"tag": tag, "chunk_size": chunk_size, "done": []}
+            done_chunks = set(progress["done"])
+            print(f"{'Resuming' if resuming else 'Importing'} {path} ({len(done_chunks)} chunks already done)")
+
+            seen = {}  # row identity -> times seen so far in this file, finished chunks included
+            for chunk_no, raw_rows in enumerate(read_chunks(path, fmt or detect_format(path), chunk_size)):
+                occurrences = []
+                for raw in raw_rows:
+                    key = row_identity(raw, default_site, site_map)
+                    occurrences.append(seen.get(key, 0))
+                    seen[key] = occurrences[-1] + 1
+                if chunk_no in done_chunks:
+                    continue
+                future = pool.submit(load_chunk, path, chunk_no, chunk_no * chunk_size, raw_rows, occurrences,
+                                     default_site, batch_size)
+                pending[future] = (path, chunk_no)
+                # Keep a couple of chunks queued per worker, not the whole file in memory
+                drain(workers * 2)
+
+        while pending:
+            drain(1)
+
+    elapsed = time.perf_counter() - started
+    print(f"Imported {totals['loaded']:,} events in {elapsed:.1f}s ({totals['loaded'] / max(elapsed, 1e-9):,.0f} rows/s); "
+          f"{totals['duplicates']:,} already stored, {totals['rejected']:,} rows rejected, {totals['failed_chunks']} chunks failed")
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import historical events from CSV or NDJSON files.")
+    parser.add_argument("files", nargs="+", help="CSV (export format) or NDJSON files")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="default: from the file extension")
+    parser.add_argument("--site-id", help="Website.id for rows without a site_id column (e.g. our own CSV exports)")
+    parser.add_argument("--map", action="append", metavar="OLD=NEW", help="map a source site id to a Website.id (repeatable)")
+    parser.add_argument("--map-file", help="CSV of old_id,new_site_id pairs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--chunk-size", type=int, default=20000, help="rows per worker task and per checkpoint step")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per executemany batch (non-Postgres)")
+    parser.add_argument("--checkpoint", default="import_checkpoint.json", help="progress file; '' to disable")
+    args = parser.parse_args(argv)
+
+    if args.site_id:
+        try:
+            py_UUID(args.site_id)
+        except ValueError:
+            raise SystemExit(f"Invalid site_id: '{args.site_id}'")
+
+    totals = import_files(
+        args.files,
+        fmt=args.format,
+        default_site=args.site_id,
+        site_map=load_site_map(args.map, args.map_file),
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint or None,
+    )
+    return 1 if totals["failed_chunks"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
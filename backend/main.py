@@ -1,22 +1,28 @@
 from fastapi import FastAPI, Request, Depends
 from fastapi.responses import PlainTextResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 
+import logging
+import os
+
 from auth import get_current_user
 from routers import events, stats
-from models import Base
 from database import engine, get_db
+from config import FRONTEND_DIR
 from sqlalchemy import text
-
-import os
+from metrics import MetricsMiddleware, render_metrics
 
 # Import routers - ensuring correct paths
 from auth import router as auth_router
 from routers.website import router as website_router
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger("glassboard")
+
+# Schema is managed with Alembic, run out-of-band before deploying:
+#   alembic upgrade head
+# (once per database: primary, and each extra event shard)
 
 # Create app
 app = FastAPI()
@@ -33,32 +39,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses (the /stats payload, exports); tiny /track replies are left alone
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# Per-route latency, SQL query counts and pool waits, exposed on /metrics
+app.add_middleware(MetricsMiddleware)
+
 # --- 2. Frontend ---
-# Try a few different ways to find the frontend folder
-possible_paths = [
-    os.path.join(os.getcwd(), "frontend"),                # /frontend
-    os.path.join(os.path.dirname(os.getcwd()), "frontend"), # ../frontend
-    "/opt/render/project/src/frontend"                    # Absolute Render path
-]
-
-frontend_path = None
-for path in possible_paths:
-    if os.path.exists(path):
-        frontend_path = path
-        print(f"DEBUG: Found frontend at {path}")
-        break
-
-if frontend_path:
-    app.mount("/frontend", StaticFiles(directory=frontend_path), name="frontend")
+if os.path.isdir(FRONTEND_DIR):
+    app.mount("/frontend", StaticFiles(directory=FRONTEND_DIR), name="frontend")
 else:
-    # If all fail, this will show us exactly where we are in the Render logs
-    print(f"DEBUG: Frontend NOT found. Current Dir: {os.getcwd()}")
-    print(f"DEBUG: Files here: {os.listdir(os.getcwd())}")
-    # Also try to look one level up
-    try:
-        print(f"DEBUG: Files one level up: {os.listdir(os.path.dirname(os.getcwd()))}")
-    except:
-        pass
+    logger.warning("Frontend directory %s not found; set FRONTEND_DIR to serve the dashboard", FRONTEND_DIR)
 
 # API routers
 app.include_router(events.router)
@@ -79,6 +70,28 @@ def tracking_snippet(site_id: str):
         (function() {{
             const SITE_ID = "{site_id}";
             const TRACKING_ENDPOINT = 'https://glassboard-hjhr.onrender.com/track/'; 
+            const SESSION_KEY = 'glassboard_session_id';
+            const MAX_RETRIES = 2;
+
+            function newId() {{
+                return (window.crypto && crypto.randomUUID)
+                    ? crypto.randomUUID()
+                    : Date.now().toString(36) + Math.random().toString(36).slice(2);
+            }}
+
+            // One session key per tab; the backend splits it on inactivity
+            function getSessionId() {{
+                try {{
+                    let sid = sessionStorage.getItem(SESSION_KEY);
+                    if (!sid) {{
+                        sid = newId();
+                        sessionStorage.setItem(SESSION_KEY, sid);
+                    }}
+                    return sid;
+                }} catch (e) {{
+                    return null;
+                }}
+            }}
 
             function sendEvent(eventType, elementDetails = {{}}) {{
                 const payload = {{
@@ -90,15 +103,31 @@ def tracking_snippet(site_id: str):
                     element: elementDetails.element || null,
                     text: elementDetails.text || null,
                     href: elementDetails.href || null,
+                    session_id: getSessionId(),
+                    // Same id on every retry, so the backend stores the event once
+                    event_id: newId(),
                 }};
+                post(payload, 0);
+            }}
 
+            function post(payload, attempt) {{
                 fetch(TRACKING_ENDPOINT, {{
                     method: 'POST',
                     headers: {{ 'Content-Type': 'application/json' }},
                     body: JSON.stringify(payload),
+                    keepalive: true,
                 }})
-                .then(res => res.json())
-                .catch(err => console.error("Glassboard Tracking failed:", err));
+                .then(res => {{
+                    if (res.status >= 500) throw new Error('HTTP ' + res.status);
+                    return res.json();
+                }})
+                .catch(err => {{
+                    if (attempt < MAX_RETRIES) {{
+                        setTimeout(() => post(payload, attempt + 1), 1000 * Math.pow(2, attempt));
+                    }} else {{
+                        console.error("Glassboard Tracking failed:", err);
+                    }}
+                }});
             }}
 
             sendEvent('page_view');
@@ -122,6 +151,11 @@ def tracking_snippet(site_id: str):
         """
     return js_code
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/test-db")
 def test_db():
     try:
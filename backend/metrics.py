@@ -0,0 +1,253 @@
+# backend/metrics.py
+#
+# Request timing, per-request SQL profiling and a Prometheus /metrics endpoint.
+#
+# - MetricsMiddleware times every request by route template (not raw path, to
+#   keep label cardinality bounded).
+# - SQLAlchemy cursor events count statements and their total time for the
+#   request in flight, on every engine including the shards.
+# - A statement repeated N1_THRESHOLD+ times in one request is flagged as a
+#   likely N+1 pattern (e.g. a lookup per row of an earlier result).
+# - MeteredQueuePool records how long each connection checkout waited.
+# - SLOW_REQUEST_MS (unset = off) logs slow requests with their captured queries.
+
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from config import SLOW_REQUEST_MS, N1_THRESHOLD
+
+logger = logging.getLogger("glassboard.metrics")
+
+# Queries kept per request for the slow log; counts and timings are never truncated
+MAX_CAPTURED_QUERIES = 200
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+CHECKOUT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values=(), amount=1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {count}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {series[-1]}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "glassboard_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+REQUESTS = Counter(
+    "glassboard_http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status"))
+QUERIES_PER_REQUEST = Histogram(
+    "glassboard_db_queries_per_request", "SQL statements executed per request.", ("route",), QUERY_COUNT_BUCKETS)
+QUERY_SECONDS = Counter(
+    "glassboard_db_query_seconds_total", "Total time spent in SQL statements, by route.", ("route",))
+N_PLUS_ONE = Counter(
+    "glassboard_db_n_plus_one_total", "Requests that repeated one SQL statement at least N1_THRESHOLD times.", ("route",))
+POOL_CHECKOUT = Histogram(
+    "glassboard_db_pool_checkout_seconds", "Time spent waiting to check a connection out of a pool.", ("pool",), CHECKOUT_BUCKETS)
+DUPLICATE_EVENTS = Counter(
+    "glassboard_duplicate_events_total", "Replayed /track events dropped, by where they were caught.", ("layer",))
+
+_pools = {}  # pool name -> engine, for the checked-out gauge
+
+
+class RequestProfile:
+    __slots__ = ("queries", "query_count", "query_seconds", "statement_counts")
+
+    def __init__(self):
+        self.queries = []
+        self.query_count = 0
+        self.query_seconds = 0.0
+        self.statement_counts = {}
+
+    def record(self, statement, seconds):
+        self.query_count += 1
+        self.query_seconds += seconds
+        self.statement_counts[statement] = self.statement_counts.get(statement, 0) + 1
+        if len(self.queries) < MAX_CAPTURED_QUERIES:
+            self.queries.append((statement, seconds))
+
+
+# The profile of the request in flight. Sync routes and the shard fan-out
+# threads run with a copy of this context, so they record into the same object.
+current_profile: ContextVar = ContextVar("current_profile", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    profile = current_profile.get()
+    if profile is not None:
+        profile.record(statement, time.perf_counter() - started)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # after_cursor_execute doesn't fire for failed statements
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    metrics_name = "default"
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            POOL_CHECKOUT.observe((self.metrics_name,), time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+
+    def capacity(self):
+        """Most connections this pool will ever hand out at once."""
+        return self.size() + max(self._max_overflow, 0)
+
+
+def watch_pool(name, engine):
+    """Labels an engine's pool for checkout metrics and the checked-out gauge."""
+    engine.pool.metrics_name = name
+    _pools[name] = engine
+
+
+def _route_label(scope):
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _finish_request(method, route, status, elapsed, profile):
+    REQUEST_LATENCY.observe((method, route), elapsed)
+    REQUESTS.inc((method, route, str(status)))
+    QUERIES_PER_REQUEST.observe((route,), profile.query_count)
+    QUERY_SECONDS.inc((route,), profile.query_seconds)
+
+    repeated = [(s, n) for s, n in profile.statement_counts.items() if n >= N1_THRESHOLD]
+    if repeated:
+        N_PLUS_ONE.inc((route,))
+        for statement, count in repeated:
+            logger.warning("Possible N+1 on %s %s: statement ran %d times: %s", method, route, count, " ".join(statement.split()))
+
+    if SLOW_REQUEST_MS and elapsed * 1000.0 >= SLOW_REQUEST_MS:
+        lines = [f"  {seconds * 1000.0:8.2f} ms  {' '.join(statement.split())}" for statement, seconds in profile.queries]
+        if profile.query_count > len(profile.queries):
+            lines.append(f"  ... {profile.query_count - len(profile.queries)} more")
+        logger.warning(
+            "Slow request %s %s: %.1f ms, %d queries (%.1f ms in SQL)\n%s",
+            method, route, elapsed * 1000.0, profile.query_count, profile.query_seconds * 1000.0, "\n".join(lines),
+        )
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            _finish_request(scope["method"], _route_label(scope), status, time.perf_counter() - started, profile)
+
+
+def render_metrics():
+    lines = []
+    for metric in (REQUEST_LATENCY, REQUESTS, QUERIES_PER_REQUEST, QUERY_SECONDS, N_PLUS_ONE, POOL_CHECKOUT, DUPLICATE_EVENTS):
+        lines.extend(metric.render())
+
+    lines.append("# HELP glassboard_db_pool_checked_out Connections currently checked out, by pool.")
+    lines.append("# TYPE glassboard_db_pool_checked_out gauge")
+    for name, engine in sorted(_pools.items()):
+        lines.append(f'glassboard_db_pool_checked_out{{pool="{_escape(name)}"}} {engine.pool.checkedout()}')
+
+    return "\n".join(lines) + "\n"
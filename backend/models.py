@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint, func
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint, Index, JSON, func
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from database import Base
@@ -9,7 +9,8 @@ class Event(Base):
     __tablename__ = "events"
 
     id = Column(Integer, primary_key=True, index=True)
-    site_id = Column(UUID(as_uuid=True), ForeignKey("websites.id", ondelete="CASCADE"), index=True)    
+    # No FK to websites: events live on the site's shard, which may be another database (see shards.py)
+    site_id = Column(UUID(as_uuid=True), index=True)
     page = Column(String)
     element = Column(String)
     text = Column(String)                # 👈 new field for button/link text
@@ -17,7 +18,18 @@ class Event(Base):
     event_type = Column(String)
     timestamp = Column(DateTime(timezone=True), default=datetime.utcnow)
     referrer = Column(String, nullable=True)
-    website = relationship("Website", back_populates="events")
+    referrer_host = Column(String, nullable=True)    # normalized at ingest, see referrers.py
+    referrer_source = Column(String, nullable=True)  # e.g. "Google", "direct", or the host
+    session_id = Column(String, nullable=True)  # client-generated per-tab session key
+    event_id = Column(String, nullable=True)    # client-generated, makes /track retries idempotent
+
+    __table_args__ = (
+        # Back the /stats/pages and /stats/referrers top-N aggregates
+        Index("ix_events_site_type_page", "site_id", "event_type", "page"),
+        Index("ix_events_site_type_source", "site_id", "event_type", "referrer_source"),
+        # A replayed event_id is rejected here; NULLs (older clients) never collide
+        Index("uix_events_site_event_id", "site_id", "event_id", unique=True),
+    )
 
 class User(Base):
     __tablename__ = "users"
@@ -40,18 +52,12 @@ class Website(Base):
     name = Column(String, nullable=True)               # optional label/business name
     domain = Column(String, nullable=True)             # optional actual domain
     user_id = Column(Integer, ForeignKey("users.id"))  # owner
+    shard = Column(String, nullable=True)              # event shard name, NULL means the primary
 
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
 
     # ORM relationship (not required, just nice to have)
     owner = relationship("User", back_populates="websites")
-
-    events = relationship(
-        "Event", 
-        back_populates="website", 
-        cascade="all, delete-orphan",  # Deletes objects in Python session
-        passive_deletes=True          # Allows DB to handle cascades for performance
-    )
     labels = relationship(
         "EventLabel", 
         back_populates="website", 
@@ -91,4 +97,36 @@ class IgnoredEvent(Base):
     # Ensures no duplicate mute rules exist for the same element/text pair on the same site
     __table_args__ = (
         UniqueConstraint("site_id", "element", "original_text", name="uix_ignored_event"),
-    )
\ No newline at end of file
+    )
+
+
+class VisitSession(Base):
+    """
+    One row per visitor session, maintained incrementally at ingest by
+    sessionization.apply_event() so reports never have to re-scan raw events.
+    """
+    __tablename__ = "visit_sessions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    site_id = Column(UUID(as_uuid=True), nullable=False)  # sharded alongside Event, so no FK
+    session_key = Column(String, nullable=False)     # Event.session_id sent by the snippet
+    seq = Column(Integer, nullable=False, default=0)  # 0, 1, 2... for a visitor's successive sessions
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    last_seen_at = Column(DateTime(timezone=True), nullable=False)
+    entry_page = Column(String, nullable=True)
+    exit_page = Column(String, nullable=True)
+    page_views = Column(Integer, nullable=False, default=0)
+    click_count = Column(Integer, nullable=False, default=0)
+    steps = Column(JSON, nullable=False, default=list)  # ordered "page:..." / "click:..." keys used by funnels
+
+    __table_args__ = (
+        # Finding the open session for a visitor is the hot path at ingest
+        Index("ix_visit_sessions_site_key_seen", "site_id", "session_key", "last_seen_at"),
+        Index("ix_visit_sessions_site_started", "site_id", "started_at"),
+        # Two workers racing to open the same visitor's next session collide here
+        Index("uix_visit_sessions_site_key_seq", "site_id", "session_key", "seq", unique=True),
+    )
+
+    @property
+    def duration_seconds(self):
+        return int((self.last_seen_at - self.started_at).total_seconds())
@@ -0,0 +1,295 @@
+# backend/move_site.py
+#
+# Moves one website's events and sessions to another shard while tracking stays live.
+#
+#   python move_site.py <site_id> <target_shard> [--batch-size 5000]
+#
+# 1. Copy the site's existing events and visit_sessions from the source shard to the target.
+# 2. Flip Website.shard so new events start landing on the target.
+# 3. Wait out every worker's shard-map cache, then copy the tail of events
+#    that was still written to the source during the switch, and merge the
+#    sessions the source kept updating into the target's copies (which may
+#    have picked up events of their own since the flip).
+# 4. Delete the site's rows from the source.
+#
+# Stats read the target from step 2 onwards, so events from the tail window
+# show up a little late but are never lost or double counted, and a visitor
+# active during the move keeps a single session.
+#
+# Event copies skip any (site_id, event_id) the target already has: a retried
+# event can land on both shards while workers switch over. The move's progress
+# is saved to a checkpoint file just before the flip and after every batch from
+# then on; if a run dies after the flip, run the same command again to finish it.
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from uuid import UUID as py_UUID
+
+from sqlalchemy import select
+
+from database import SessionLocal
+from models import Event, VisitSession, Website
+from sessionization import MAX_SESSION_STEPS, as_utc
+from config import SHARD_MAP_TTL_SECONDS
+from shards import SHARDS, get_shard, insert_new_events, shard_name
+
+events_table = Event.__table__
+sessions_table = VisitSession.__table__
+
+
+def copy_rows(table, site_id, source_engine, target_engine, after_id=0, batch_size=5000, on_batch=None):
+    """
+    Copies rows of table for site_id with id > after_id in id order. Ids are
+    not copied (the target assigns its own); events already on the target are
+    skipped. Calls on_batch(last source id) after each committed batch.
+    Returns (rows copied, last source id).
+    """
+    columns = [c for c in table.columns if c.name != "id"]
+    insert = insert_new_events(target_engine) if table is events_table else table.insert()
+    copied = 0
+    last_id = after_id
+
+    while True:
+        with source_engine.connect() as src:
+            rows = src.execute(
+                select(table.c.id, *columns)
+                .where(table.c.site_id == site_id, table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).fetchall()
+        if not rows:
+            break
+
+        with target_engine.begin() as dst:
+            dst.execute(insert, [{c.name: row._mapping[c.name] for c in columns} for row in rows])
+
+        copied += len(rows)
+        last_id = rows[-1].id
+        if on_batch:
+            on_batch(last_id)
+        print(f"  {table.name}: copied {copied} rows")
+
+    return copied, last_id
+
+
+def session_snapshot(site_id, engine):
+    """(session_key, seq) -> the counters of each session as copied, to tell later changes apart."""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(sessions_table.c.session_key, sessions_table.c.seq, sessions_table.c.page_views,
+                   sessions_table.c.click_count, sessions_table.c.steps, sessions_table.c.last_seen_at)
+            .where(sessions_table.c.site_id == site_id)
+        ).fetchall()
+    return {(r.session_key, r.seq): (r.page_views, r.click_count, len(r.steps or []), as_utc(r.last_seen_at)) for r in rows}
+
+
+def merged_session(source, target, base):
+    """
+    Combines a session's final source row with the target's row. Both started
+    from the copied snapshot (base); the source then got events until the flip,
+    the target after it.
+    """
+    base_views, base_clicks, base_steps, _ = base or (0, 0, 0, None)
+    earlier = source if as_utc(source.started_at) <= as_utc(target.started_at) else target
+    later = source if as_utc(source.last_seen_at) >= as_utc(target.last_seen_at) else target
+    return {
+        "started_at": earlier.started_at,
+        "entry_page": earlier.entry_page,
+        "last_seen_at": later.last_seen_at,
+        # Target events all came after the flip, so its exit page wins if it saw any page views
+        "exit_page": target.exit_page if target.page_views > base_views else source.exit_page,
+        "page_views": target.page_views + source.page_views - base_views,
+        "click_count": target.click_count + source.click_count - base_clicks,
+        "steps": (list(source.steps or []) + list(target.steps or [])[base_steps:])[:MAX_SESSION_STEPS],
+    }
+
+
+def merge_sessions(site_id, source_engine, target_engine, snapshot, after_id=0, batch_size=5000, on_batch=None):
+    """
+    Brings the target's visit_sessions up to date with the source's final state,
+    keyed by (session_key, seq), for source rows with id > after_id. Calls
+    on_batch(last source id) after each committed batch. Returns (inserted, merged).
+    """
+    columns = [c for c in sessions_table.columns if c.name != "id"]
+    inserted = merged = 0
+    last_id = after_id
+
+    while True:
+        with source_engine.connect() as src:
+            rows = src.execute(
+                select(sessions_table)
+                .where(sessions_table.c.site_id == site_id, sessions_table.c.id > last_id)
+                .order_by(sessions_table.c.id)
+                .limit(batch_size)
+            ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        with target_engine.begin() as dst:
+            existing = {
+                (r.session_key, r.seq): r
+                for r in dst.execute(
+                    select(sessions_table).where(
+                        sessions_table.c.site_id == site_id,
+                        sessions_table.c.session_key.in_({r.session_key for r in rows}),
+                    )
+                )
+            }
+            for row in rows:
+                key = (row.session_key, row.seq)
+                base = snapshot.get(key)
+                target_row = existing.get(key)
+                if target_row is None:
+                    dst.execute(sessions_table.insert(), {c.name: row._mapping[c.name] for c in columns})
+                    inserted += 1
+                elif base != (row.page_views, row.click_count, len(row.steps or []), as_utc(row.last_seen_at)):
+                    # Changed on the source after the copy (or opened there after it)
+                    dst.execute(
+                        sessions_table.update().where(sessions_table.c.id == target_row.id),
+                        merged_session(row, target_row, base),
+                    )
+                    merged += 1
+        if on_batch:
+            on_batch(last_id)
+
+    return inserted, merged
+
+
+# --- Checkpoints ---------------------------------------------------------------
+
+def dump_snapshot(snapshot):
+    """session_snapshot() as JSON-friendly rows."""
+    return [[key, seq, *counts[:3], counts[3].isoformat() if counts[3] else None] for (key, seq), counts in snapshot.items()]
+
+
+def load_snapshot(rows):
+    return {(key, seq): (views, clicks, steps, datetime.fromisoformat(seen) if seen else None)
+            for key, seq, views, clicks, steps, seen in rows}
+
+
+def load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"moves": {}}
+
+
+def save_checkpoint(path, state):
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def delete_rows(table, site_id, engine):
+    with engine.begin() as conn:
+        return conn.execute(table.delete().where(table.c.site_id == site_id)).rowcount
+
+
+def move_site(site_id, target, batch_size=5000, checkpoint_path=None):
+    if target not in SHARDS:
+        raise SystemExit(f"Unknown shard '{target}'. Configured: {', '.join(SHARDS)}")
+
+    state = load_checkpoint(checkpoint_path)
+    move = state["moves"].get(str(site_id))
+    if move and move["target"] != target:
+        raise SystemExit(f"An unfinished move of {site_id} to '{move['target']}' is recorded in {checkpoint_path}; "
+                         f"run that move again to finish it first")
+
+    def save(**progress):
+        move.update(progress)
+        save_checkpoint(checkpoint_path, state)
+
+    db = SessionLocal()
+    try:
+        website = db.query(Website).filter(Website.id == site_id).first()
+        if not website:
+            raise SystemExit(f"Website {site_id} not found")
+
+        if move:
+            # The copy before the flip finished; pick up from the saved cursors
+            source = move["source"]
+            print(f"Resuming move of {site_id} from '{source}' to '{target}'")
+        else:
+            source = shard_name(website)
+            if source == target:
+                raise SystemExit(f"Website {site_id} is already on shard '{target}'")
+            print(f"Moving {site_id} from '{source}' to '{target}'")
+
+        source_engine = get_shard(source).ingest_engine
+        target_engine = get_shard(target).ingest_engine
+
+        if not move:
+            # Leftovers from a run that died before the flip would otherwise be duplicated
+            for table in (events_table, sessions_table):
+                removed = delete_rows(table, site_id, target_engine)
+                if removed:
+                    print(f"  {table.name}: cleared {removed} leftover rows on '{target}'")
+
+            # 1. Bulk copy while the source keeps taking writes
+            copied, cursor = copy_rows(events_table, site_id, source_engine, target_engine, batch_size=batch_size)
+            print(f"Initial copy done ({copied} events)")
+
+            # Sessions too, so events landing on the target after the flip continue
+            # them instead of opening duplicates
+            sessions, _ = copy_rows(sessions_table, site_id, source_engine, target_engine, batch_size=batch_size)
+            snapshot = session_snapshot(site_id, target_engine)
+            print(f"Copied {sessions} sessions")
+
+            move = state["moves"][str(site_id)] = {"source": source, "target": target}
+            save(cursor=cursor, snapshot=dump_snapshot(snapshot), merged_through=0)
+
+        # 2. Flip the shard map
+        if website.shard != target:
+            website.shard = target
+            db.commit()
+        print(f"Shard map updated; waiting {SHARD_MAP_TTL_SECONDS:.0f}s for workers to pick it up")
+    finally:
+        db.close()
+
+    # 3. Every worker has re-read the map after this, so the source is quiet for this site
+    time.sleep(SHARD_MAP_TTL_SECONDS + 1)
+    tail, _ = copy_rows(events_table, site_id, source_engine, target_engine, after_id=move["cursor"],
+                        batch_size=batch_size, on_batch=lambda last_id: save(cursor=last_id))
+    print(f"Tail copy done ({tail} events)")
+
+    inserted, merged = merge_sessions(site_id, source_engine, target_engine, load_snapshot(move["snapshot"]),
+                                      after_id=move["merged_through"], batch_size=batch_size,
+                                      on_batch=lambda last_id: save(merged_through=last_id))
+    print(f"Session sync done ({inserted} new, {merged} merged)")
+
+    # 4. Remove the source copy
+    for table in (events_table, sessions_table):
+        removed = delete_rows(table, site_id, source_engine)
+        print(f"  {table.name}: removed {removed} rows from '{source}'")
+
+    del state["moves"][str(site_id)]
+    save_checkpoint(checkpoint_path, state)
+    print("Move complete")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move a website's events to another shard online.")
+    parser.add_argument("site_id", help="Website.id (UUID)")
+    parser.add_argument("target", help="Target shard name from EVENT_SHARDS, or 'primary'")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--checkpoint", default="move_checkpoint.json", help="progress file; '' to disable")
+    args = parser.parse_args(argv)
+
+    try:
+        site_id = py_UUID(args.site_id)
+    except ValueError:
+        raise SystemExit(f"Invalid site_id: '{args.site_id}'")
+
+    move_site(site_id, args.target, batch_size=args.batch_size, checkpoint_path=args.checkpoint or None)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
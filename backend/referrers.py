@@ -0,0 +1,67 @@
+# backend/referrers.py
+
+from urllib.parse import urlsplit
+
+# Well-known referrer domains collapsed into one source name.
+# Matched against the host and every parent domain (m.facebook.com -> facebook.com).
+KNOWN_SOURCES = {
+    "bing.com": "Bing",
+    "duckduckgo.com": "DuckDuckGo",
+    "search.yahoo.com": "Yahoo",
+    "yahoo.com": "Yahoo",
+    "baidu.com": "Baidu",
+    "yandex.ru": "Yandex",
+    "facebook.com": "Facebook",
+    "instagram.com": "Instagram",
+    "linkedin.com": "LinkedIn",
+    "lnkd.in": "LinkedIn",
+    "reddit.com": "Reddit",
+    "youtube.com": "YouTube",
+    "twitter.com": "Twitter",
+    "x.com": "Twitter",
+    "t.co": "Twitter",
+    "news.ycombinator.com": "Hacker News",
+    "github.com": "GitHub",
+}
+
+DIRECT = "direct"
+
+
+def normalize_referrer(referrer):
+    """
+    Returns (host, source) for a raw referrer URL.
+
+    host is the lowercased hostname without a leading "www." and source is a
+    stable grouping key: a known name like "Google", otherwise the host.
+    Missing referrers (and the snippet's "direct" placeholder) map to (None, "direct").
+    """
+    if not referrer:
+        return None, DIRECT
+
+    raw = referrer.strip()
+    if not raw or raw.lower() in (DIRECT, "null", "none"):
+        return None, DIRECT
+
+    try:
+        host = urlsplit(raw if "://" in raw else "//" + raw).hostname
+    except ValueError:
+        host = None
+
+    if not host:
+        return None, DIRECT
+
+    host = host.lower().rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+
+    # Google has a country TLD per market (google.co.uk, google.de, ...)
+    labels = host.split(".")
+    if "google" in labels[:-1]:
+        return host, "Google"
+
+    for i in range(len(labels) - 1):
+        source = KNOWN_SOURCES.get(".".join(labels[i:]))
+        if source:
+            return host, source
+
+    return host, host
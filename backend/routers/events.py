@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 from typing import Optional, List
-from database import get_db
-from models import Event
+from sqlalchemy.exc import IntegrityError
+from models import Event, VisitSession
+from shards import SHARD_NAMES, ingest_session, lookup_site_shard
+from sessionization import apply_event
+from referrers import normalize_referrer
+from dedup import recent_events
+from metrics import DUPLICATE_EVENTS
 from datetime import datetime
 from uuid import UUID as py_UUID # Standard Python UUID library
 
@@ -17,14 +21,19 @@ class IncomingEvent(BaseModel):
     element: Optional[str] = None
     text: Optional[str] = None
     href: Optional[str] = None
+    session_id: Optional[str] = None
+    # Client-generated id (a UUID from the snippet). Resending the same id is a no-op.
+    event_id: Optional[str] = Field(default=None, max_length=64)
 
 # Renaming router prefix to /track for clarity
 router = APIRouter(prefix="/track", tags=["Tracking"])
 
 @router.post("/")
-async def record_single_event(payload: IncomingEvent, db: Session = Depends(get_db)):
+def record_single_event(payload: IncomingEvent):
     """
     Handles a single event payload sent directly from the JS snippet.
+    Plain def on purpose: the DB work blocks, so it belongs in the threadpool,
+    not on the event loop every other route shares.
     """
     try:
         # The py_UUID(payload.site_id) constructor correctly formats the 32-char hex string
@@ -37,6 +46,16 @@ async def record_single_event(payload: IncomingEvent, db: Session = Depends(get_
             detail=f"Invalid site_id format received: '{payload.site_id}'. Expected 32-character hex."
         )
 
+    # Route the write to the shard that owns this site (cached, so usually no lookup)
+    shard = lookup_site_shard(formatted_site_id)
+    if shard is None:
+        raise HTTPException(status_code=404, detail=f"Unknown site_id: '{payload.site_id}'.")
+
+    # Replay of an event this worker stored recently: skip the DB entirely
+    if payload.event_id and recent_events.seen(formatted_site_id, payload.event_id):
+        DUPLICATE_EVENTS.inc(("memory",))
+        return {"status": "duplicate"}
+
     # Convert timestamp string (like '2025-11-07T21:20:33.230Z') to datetime
     ts = datetime.utcnow()
     try:
@@ -45,6 +64,9 @@ async def record_single_event(payload: IncomingEvent, db: Session = Depends(get_
     except Exception:
         pass # Fallback to current time if parsing fails
             
+    # Normalize once here so stats can GROUP BY instead of re-parsing raw URLs
+    referrer_host, referrer_source = normalize_referrer(payload.referrer)
+
     db_event = Event(
         site_id=formatted_site_id, # <-- FIX 2: Use the formatted UUID object
         event_type=payload.event_type,
@@ -53,17 +75,41 @@ async def record_single_event(payload: IncomingEvent, db: Session = Depends(get_
         text=payload.text,
         href=payload.href,
         referrer=payload.referrer,
+        referrer_host=referrer_host,
+        referrer_source=referrer_source,
+        session_id=payload.session_id,
+        event_id=payload.event_id or None,
         timestamp=ts,
     )
-    db.add(db_event)
-    
-    # Commit within the request handler is acceptable for a tracking endpoint
-    db.commit() 
+    with ingest_session(shard) as db:
+        try:
+            db.add(db_event)
+
+            # Keep the visitor's session row current so funnels never re-scan raw events
+            apply_event(db, db_event)
+
+            # Commit within the request handler is acceptable for a tracking endpoint
+            db.commit()
+        except IntegrityError:
+            # The unique (site_id, event_id) index caught a replay the memory window missed.
+            # Rolling back also undoes the session update, so it isn't counted twice either.
+            db.rollback()
+            if not payload.event_id:
+                raise
+            DUPLICATE_EVENTS.inc(("database",))
+            recent_events.add(formatted_site_id, payload.event_id)
+            return {"status": "duplicate"}
+
+    if payload.event_id:
+        recent_events.add(formatted_site_id, payload.event_id)
     return {"status": "ok"}
 
 # Keeping reset route for convenience
 @router.delete("/reset")
-async def reset_events(db: Session = Depends(get_db)):
-    db.query(Event).delete()
-    db.commit()
+def reset_events():
+    for shard in SHARD_NAMES:
+        with ingest_session(shard) as db:
+            db.query(Event).delete()
+            db.query(VisitSession).delete()
+            db.commit()
     return {"status": "reset"}
\ No newline at end of file
@@ -1,74 +1,54 @@
-from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, Query, Response, HTTPException, status
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, Query, Request, Response, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, literal_column, case
 from sqlalchemy.sql import tuple_
-from database import get_db
-from models import Event, EventLabel, IgnoredEvent, Website
+from database import get_db, get_read_db, note_write
+from models import Event, EventLabel, IgnoredEvent, Website, VisitSession
+from sessionization import as_utc, page_step, click_step, funnel_counts
+from shards import fan_out, sites_by_shard
+from compact import FastJSONResponse, StringTable, encode_columns
 from auth import get_current_user
 import csv
 import io
-from weasyprint import HTML
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Optional, List
 from uuid import UUID as py_UUID
 
 router = APIRouter(prefix="/stats", tags=["Stats"])
 
-@router.get("")
-def get_stats(
-    site_id: str = Query(None), 
-    db: Session = Depends(get_db),
-    user = Depends(get_current_user)
-):
-    now = datetime.utcnow()
-    
-    # --- 1. BASE QUERY (Securely scoped to User) ---
-    base_query_unfiltered = db.query(Event).join(Website).filter(
-        Website.user_id == user.id
-    )
+def _websites_in_scope(db: Session, user, site_id: Optional[str]):
+    """
+    Returns the Website rows a request covers: the one requested (after an
+    ownership check) or all of the user's sites for "All Sites".
+    """
+    if not site_id:
+        return db.query(Website).filter(Website.user_id == user.id).all()
 
-    formatted_site_id = None
-    if site_id:
-        try:
-            formatted_site_id = py_UUID(site_id)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid site_id format provided.")
-
-        # IDOR Check
-        website = db.query(Website).filter(
-            Website.id == formatted_site_id
-        ).first()
-
-        if not website or website.user_id != user.id:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, 
-                detail="Website not found or access denied."
-            )
-            
-        base_query_unfiltered = base_query_unfiltered.filter(
-            Event.site_id == formatted_site_id
+    try:
+        formatted_site_id = py_UUID(site_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid site_id format provided.")
+
+    # IDOR Check
+    website = db.query(Website).filter(Website.id == formatted_site_id).first()
+    if not website or website.user_id != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Website not found or access denied."
         )
-    
-    # --- 2. IGNORED EVENTS (MUTES) ---
-    
-    user_website_ids = db.query(Website.id).filter(Website.user_id == user.id).all()
-    user_website_ids = [id[0] for id in user_website_ids]
 
-    # We ONLY load mutes that belong to the user's specific sites.    
-    if formatted_site_id:
-        ignored_patterns_query = db.query(IgnoredEvent).filter(
-            IgnoredEvent.site_id == formatted_site_id
-        )
-    else:
-        # Case: All Sites Selected -> Only load mutes for ANY of the user's sites
-        ignored_patterns_query = db.query(IgnoredEvent).filter(
-            IgnoredEvent.site_id.in_(user_website_ids)
-        )
+    return [website]
 
-    ignored_patterns_query = ignored_patterns_query.all()
-    
-    ignored_tuples = [(i.element.lower(), i.original_text.lower()) for i in ignored_patterns_query]
+_EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+def _newest_first(rows, timestamp_of):
+    # Shards may mix naive (SQLite) and aware (Postgres) timestamps, so compare as UTC
+    return sorted(rows, key=lambda r: as_utc(timestamp_of(r)) if timestamp_of(r) else _EPOCH, reverse=True)
+
+def _shard_event_stats(db: Session, site_ids, ignored_tuples, now):
+    """All event aggregates for the given sites on one shard."""
+    base_query_unfiltered = db.query(Event).filter(Event.site_id.in_(site_ids))
 
     base_query_filtered = base_query_unfiltered
     if ignored_tuples:
@@ -77,9 +57,9 @@ def get_stats(
         )
         base_query_filtered = base_query_filtered.filter(exclusion_filter)
 
-    # --- 3. CLICK AGGREGATION ---
+    # --- CLICKS ---
     click_base_query = base_query_filtered.filter(func.lower(Event.event_type) == 'click')
-    
+
     all_events = (
         click_base_query
         .with_entities(Event.element, Event.text, Event.page, Event.referrer, Event.timestamp)
@@ -87,20 +67,12 @@ def get_stats(
         .all()
     )
 
-    total_clicks = len(all_events)
-
     def count_clicks_since(days: int = 0, weeks: int = 0):
         q = click_base_query.with_entities(func.count(Event.id))
         q = q.filter(Event.timestamp >= now - timedelta(days=days, weeks=weeks))
         return q.scalar() or 0
 
-    day_clicks = count_clicks_since(days=1)
-    week_clicks = count_clicks_since(weeks=1)
-    month_clicks = count_clicks_since(days=30)
-    year_clicks = count_clicks_since(days=365)
-
-    # --- Group top clicked elements ---
-    grouped_query = (
+    grouped = (
         click_base_query
         .with_entities(
             Event.element,
@@ -110,84 +82,357 @@ def get_stats(
         )
         .group_by(Event.element, Event.text)
         .order_by(func.count(Event.id).desc())
+        .all()
     )
-    grouped = grouped_query.all()
-
-    summary = []
-    for g in grouped:
-        label_query = db.query(EventLabel).filter(
-            EventLabel.element == g.element,
-            EventLabel.original_text == g.text
-        )
-        
-        if formatted_site_id:
-            label_query = label_query.filter(EventLabel.site_id == formatted_site_id)
-        else:
-            label_query = label_query.filter(EventLabel.site_id.in_(user_website_ids))
-
-        label = label_query.first()
-        custom_text = label.custom_text if label else g.text
-
-        summary.append({
-            "element": g.element,
-            "text": custom_text,
-            "original_text": g.text,
-            "count": g.count,
-            "last_click": g.last_click.isoformat() if g.last_click else None
-        })
 
-    # --- 4. PAGE VISITS ---
+    # --- PAGE VISITS ---
     visit_base_query = base_query_unfiltered.filter(func.lower(Event.event_type) == 'page_view')
-    
+
     def count_visits_since(days: int = 0, weeks: int = 0):
         q = visit_base_query.with_entities(func.count(Event.id))
         if days > 0 or weeks > 0:
             q = q.filter(Event.timestamp >= now - timedelta(days=days, weeks=weeks))
         return q.scalar() or 0
-    
-    total_visits = visit_base_query.count()
-    day_visits = count_visits_since(days=1)
-    week_visits = count_visits_since(weeks=1)
-    month_visits = count_visits_since(days=30)
-    year_visits = count_visits_since(days=365)
 
     return {
+        "clicks": all_events,
+        "click_windows": [count_clicks_since(days=1), count_clicks_since(weeks=1), count_clicks_since(days=30), count_clicks_since(days=365)],
+        "grouped": [(g.element, g.text, g.count, g.last_click) for g in grouped],
+        "visits": visit_base_query.with_entities(Event.page, Event.referrer, Event.timestamp).all(),
+        "total_visits": visit_base_query.count(),
+        "visit_windows": [count_visits_since(days=1), count_visits_since(weeks=1), count_visits_since(days=30), count_visits_since(days=365)],
+    }
+
+@router.get("")
+def get_stats(
+    site_id: str = Query(None), 
+    format: str = Query("json"),
+    db: Session = Depends(get_read_db),
+    user = Depends(get_current_user)
+):
+    if format not in ("json", "compact"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'compact'.")
+    now = datetime.utcnow()
+    
+    # --- 1. SITES IN SCOPE (Securely scoped to User) ---
+    websites = _websites_in_scope(db, user, site_id)
+    site_ids = [w.id for w in websites]
+
+    # --- 2. IGNORED EVENTS (MUTES) ---
+    # We ONLY load mutes that belong to the user's sites in scope.
+    ignored_patterns_query = db.query(IgnoredEvent).filter(IgnoredEvent.site_id.in_(site_ids)).all()
+    ignored_tuples = [(i.element.lower(), i.original_text.lower()) for i in ignored_patterns_query]
+
+    # --- 3. CUSTOM LABELS (Loaded now, fan_out releases this session's connection) ---
+    labels = {}
+    for l in db.query(EventLabel).filter(EventLabel.site_id.in_(site_ids)):
+        labels.setdefault((l.element, l.original_text), l.custom_text)
+
+    # --- 4. EVENT AGGREGATES (Fanned out to every shard holding these sites) ---
+    partials = fan_out(
+        db,
+        sites_by_shard(websites),
+        lambda shard_db, shard_site_ids: _shard_event_stats(shard_db, shard_site_ids, ignored_tuples, now)
+    )
+
+    all_events = [e for p in partials for e in p["clicks"]]
+    all_visits = [v for p in partials for v in p["visits"]]
+    if len(partials) > 1:
+        all_events = _newest_first(all_events, lambda e: e[4])
+
+    total_clicks = len(all_events)
+    day_clicks, week_clicks, month_clicks, year_clicks = (sum(c) for c in zip(*[p["click_windows"] for p in partials])) if partials else (0, 0, 0, 0)
+    total_visits = sum(p["total_visits"] for p in partials)
+    day_visits, week_visits, month_visits, year_visits = (sum(c) for c in zip(*[p["visit_windows"] for p in partials])) if partials else (0, 0, 0, 0)
+
+    # --- Merge top clicked elements across shards ---
+    merged = {}
+    for p in partials:
+        for element, text, count, last_click in p["grouped"]:
+            key = (element, text)
+            if key in merged:
+                prev_count, prev_last = merged[key]
+                if prev_last is None or (last_click is not None and as_utc(last_click) > as_utc(prev_last)):
+                    prev_last = last_click
+                merged[key] = (prev_count + count, prev_last)
+            else:
+                merged[key] = (count, last_click)
+    grouped = sorted(merged.items(), key=lambda kv: kv[1][0], reverse=True)
+
+    summary = []
+    for (element, text), (count, last_click) in grouped:
+        custom_text = labels.get((element, text), text)
+
+        summary.append({
+            "element": element,
+            "text": custom_text,
+            "original_text": text,
+            "count": count,
+            "last_click": last_click.isoformat() if last_click else None
+        })
+
+    result = {
         "total_clicks": total_clicks, "day_clicks": day_clicks, "week_clicks": week_clicks, "month_clicks": month_clicks, "year_clicks": year_clicks,
         "total_visits": total_visits, "day_visits": day_visits, "week_visits": week_visits, "month_visits": month_visits, "year_visits": year_visits,
-        "all_clicks": [{"element": e[0], "text": e[1], "page": e[2], "referrer": e[3], "timestamp": e[4].isoformat() if e[4] else None} for e in all_events],
-        "all_visits": [{"page": v.page, "referrer": v.referrer, "timestamp": v.timestamp.isoformat() if v.timestamp else None} for v in visit_base_query.all()],
         "summary": summary,
     }
 
+    if format == "compact":
+        # Column arrays + one shared string table; see compact.py and decodeCompactStats in dashboard.js
+        strings = StringTable()
+        result["format"] = "compact"
+        result["all_clicks"] = encode_columns(all_events, ("element", "text", "page", "referrer"), "timestamp", strings)
+        result["all_visits"] = encode_columns(all_visits, ("page", "referrer"), "timestamp", strings)
+        result["strings"] = strings.values
+    else:
+        result["all_clicks"] = [{"element": e[0], "text": e[1], "page": e[2], "referrer": e[3], "timestamp": e[4].isoformat() if e[4] else None} for e in all_events]
+        result["all_visits"] = [{"page": v.page, "referrer": v.referrer, "timestamp": v.timestamp.isoformat() if v.timestamp else None} for v in all_visits]
+
+    # Already plain JSON types, so skip jsonable_encoder's walk over every row
+    return FastJSONResponse(result)
+
+def _page_view_breakdown(db: Session, user, site_id: Optional[str], days: Optional[int], key, limit: int):
+    """Top-N page_view counts grouped by key, summed across the shards in scope."""
+    websites = _websites_in_scope(db, user, site_id)
+    site_ids_by_shard = sites_by_shard(websites)
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+
+    def breakdown(shard_db: Session, site_ids):
+        # Exact match on event_type (the snippet always sends lowercase) so the
+        # (site_id, event_type, ...) indexes can be used
+        visit_count = func.count(Event.id).label("visits")
+        q = shard_db.query(key, visit_count).filter(
+            Event.site_id.in_(site_ids),
+            Event.event_type == "page_view",
+        )
+        if since:
+            q = q.filter(Event.timestamp >= since)
+        q = q.group_by(key)
+        if len(site_ids_by_shard) == 1:
+            # A single shard's top N is already the answer
+            q = q.order_by(visit_count.desc()).limit(limit)
+        return q.all()
+
+    totals = {}
+    for rows in fan_out(db, site_ids_by_shard, breakdown):
+        for value, visits in rows:
+            totals[value] = totals.get(value, 0) + visits
+
+    return sorted(totals.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+
+# PAGE & REFERRER BREAKDOWNS (Top-N aggregates computed in the database)
+
+@router.get("/pages")
+def get_top_pages(
+    site_id: str = Query(None),
+    days: int = Query(None, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+    user = Depends(get_current_user)
+):
+    rows = _page_view_breakdown(db, user, site_id, days, Event.page, limit)
+    return {"pages": [{"page": page, "visits": visits} for page, visits in rows]}
+
+@router.get("/referrers")
+def get_top_referrers(
+    site_id: str = Query(None),
+    days: int = Query(None, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+    user = Depends(get_current_user)
+):
+    # Literal (not a bound param) so Postgres sees identical SELECT and GROUP BY expressions
+    source = func.coalesce(Event.referrer_source, literal_column("'direct'"))
+    rows = _page_view_breakdown(db, user, site_id, days, source, limit)
+    return {"referrers": [{"source": source, "visits": visits} for source, visits in rows]}
+
+# ALL-SITES OVERVIEW (Per-site numbers for every site in one request)
+
+_WINDOW_NAMES = ("day", "week", "month", "year")
+
+def _window_sums(now):
+    """sum(CASE ...) columns counting rows newer than each dashboard window."""
+    cutoffs = [now - timedelta(days=1), now - timedelta(weeks=1), now - timedelta(days=30), now - timedelta(days=365)]
+    return [func.sum(case((Event.timestamp >= cutoff, 1), else_=0)) for cutoff in cutoffs]
+
+def _shard_overview(db: Session, site_ids, now):
+    """Two grouped queries per shard however many sites it holds."""
+    clicks = (
+        db.query(Event.site_id, Event.element, Event.text, func.count(Event.id), func.max(Event.timestamp), *_window_sums(now))
+        .filter(Event.site_id.in_(site_ids), func.lower(Event.event_type) == "click")
+        .group_by(Event.site_id, Event.element, Event.text)
+        .all()
+    )
+    visits = (
+        db.query(Event.site_id, func.count(Event.id), *_window_sums(now))
+        .filter(Event.site_id.in_(site_ids), func.lower(Event.event_type) == "page_view")
+        .group_by(Event.site_id)
+        .all()
+    )
+    return clicks, visits
+
+@router.get("/overview")
+def get_overview(
+    top: int = Query(3, ge=0, le=20),
+    db: Session = Depends(get_read_db),
+    user = Depends(get_current_user)
+):
+    """
+    Click/visit window counts and top elements for each of the user's sites.
+    Same numbers as /stats?site_id=... per site, without one request per site.
+    """
+    now = datetime.utcnow()
+    websites = _websites_in_scope(db, user, None)
+    site_ids = [w.id for w in websites]
+
+    # Mutes and labels for every site in two queries, matched in Python below
+    muted = {
+        (i.site_id, i.element.lower(), i.original_text.lower())
+        for i in db.query(IgnoredEvent).filter(IgnoredEvent.site_id.in_(site_ids))
+    }
+    labels = {
+        (l.site_id, l.element, l.original_text): l.custom_text
+        for l in db.query(EventLabel).filter(EventLabel.site_id.in_(site_ids))
+    }
+
+    sites = {
+        w.id: {
+            "site_id": str(w.id), "name": w.name, "domain": w.domain,
+            "total_clicks": 0, **{f"{n}_clicks": 0 for n in _WINDOW_NAMES},
+            "total_visits": 0, **{f"{n}_visits": 0 for n in _WINDOW_NAMES},
+            "elements": {},
+        }
+        for w in websites
+    }
+
+    partials = fan_out(db, sites_by_shard(websites), lambda shard_db, shard_site_ids: _shard_overview(shard_db, shard_site_ids, now)) if websites else []
+    for clicks, visits in partials:
+        for site, element, text, count, last_click, *windows in clicks:
+            if (site, (element or "").lower(), (text or "").lower()) in muted:
+                continue
+            entry = sites[site]
+            entry["total_clicks"] += count
+            for name, n in zip(_WINDOW_NAMES, windows):
+                entry[f"{name}_clicks"] += n or 0
+            # A site mid-move (move_site.py) can briefly have rows on two shards
+            prev_count, prev_last = entry["elements"].get((element, text), (0, None))
+            if prev_last is not None and (last_click is None or as_utc(prev_last) > as_utc(last_click)):
+                last_click = prev_last
+            entry["elements"][(element, text)] = (prev_count + count, last_click)
+        for site, count, *windows in visits:
+            entry = sites[site]
+            entry["total_visits"] += count
+            for name, n in zip(_WINDOW_NAMES, windows):
+                entry[f"{name}_visits"] += n or 0
+
+    for site, entry in sites.items():
+        elements = sorted(entry.pop("elements").items(), key=lambda kv: kv[1][0], reverse=True)[:top]
+        entry["top_elements"] = [
+            {
+                "element": element,
+                "text": labels.get((site, element, text), text),
+                "original_text": text,
+                "count": count,
+                "last_click": last_click.isoformat() if last_click else None,
+            }
+            for (element, text), (count, last_click) in elements
+        ]
+
+    return FastJSONResponse({"sites": list(sites.values())})
+
+# FUNNEL ANALYSIS (Computed from the visit_sessions table, never raw events)
+
+class FunnelStep(BaseModel):
+    page: Optional[str] = None
+    element: Optional[str] = None
+    text: Optional[str] = None
+
+class FunnelRequest(BaseModel):
+    site_id: Optional[str] = None
+    steps: List[FunnelStep]
+    days: Optional[int] = Field(default=None, ge=1)  # only sessions started in the last N days
+
+@router.post("/funnel")
+def get_funnel(payload: FunnelRequest, db: Session = Depends(get_read_db), user = Depends(get_current_user)):
+    if not payload.steps:
+        raise HTTPException(status_code=400, detail="At least one funnel step is required.")
+
+    funnel_steps = []
+    for step in payload.steps:
+        if step.page:
+            funnel_steps.append(page_step(step.page))
+        elif step.element:
+            # The snippet always sends a click's text ('N/A' when it has none), so a step without one would never match
+            if not step.text:
+                raise HTTPException(status_code=400, detail="Click steps need both element and text.")
+            funnel_steps.append(click_step(step.element, step.text))
+        else:
+            raise HTTPException(status_code=400, detail="Each funnel step needs a page or an element.")
+
+    websites = _websites_in_scope(db, user, payload.site_id)
+    since = datetime.utcnow() - timedelta(days=payload.days) if payload.days else None
+
+    def shard_funnel(shard_db: Session, site_ids):
+        session_query = shard_db.query(VisitSession.steps).filter(VisitSession.site_id.in_(site_ids))
+        if since:
+            session_query = session_query.filter(VisitSession.started_at >= since)
+        # Stream the step paths so large sites don't materialize every session at once
+        return funnel_counts((row.steps for row in session_query.yield_per(1000)), funnel_steps)
+
+    counts = [0] * len(funnel_steps)
+    for shard_counts in fan_out(db, sites_by_shard(websites), shard_funnel):
+        counts = [a + b for a, b in zip(counts, shard_counts)]
+
+    entered = counts[0] if counts else 0
+    result = []
+    for i, (step, count) in enumerate(zip(payload.steps, counts)):
+        previous = counts[i - 1] if i > 0 else count
+        result.append({
+            "step": i + 1,
+            "page": step.page,
+            "element": step.element,
+            "text": step.text,
+            "sessions": count,
+            "step_conversion": round(count / previous, 4) if previous else 0.0,
+            "overall_conversion": round(count / entered, 4) if entered else 0.0,
+        })
+
+    return {"steps": result}
+
+def _export_events(db: Session, user, site_id: Optional[str]):
+    """Every event in scope, newest first, gathered from all owning shards."""
+    websites = _websites_in_scope(db, user, site_id)
+    partials = fan_out(
+        db,
+        sites_by_shard(websites),
+        lambda shard_db, site_ids: shard_db.query(Event).filter(Event.site_id.in_(site_ids)).order_by(Event.timestamp.desc()).all()
+    )
+    events = [e for p in partials for e in p]
+    if len(partials) > 1:
+        events = _newest_first(events, lambda e: e.timestamp)
+    return events
+
 # EXPORT ROUTES (Applies same filtering logic)
 @router.get("/export/csv")
-def export_csv(site_id: str = Query(None), db: Session = Depends(get_db), user = Depends(get_current_user)):
-    base_query = db.query(Event).join(Website).filter(Website.user_id == user.id)
-    
-    if site_id:
-        base_query = base_query.filter(Event.site_id == site_id)
-
-    events = base_query.order_by(Event.timestamp.desc()).all()
+def export_csv(site_id: str = Query(None), db: Session = Depends(get_read_db), user = Depends(get_current_user)):
+    events = _export_events(db, user, site_id)
 
     if not events:
         return Response(content="No events found", media_type="text/plain")
 
     output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=["id","event_type","page","referrer","element","text","href","timestamp"])
+    # site_id, session_id and event_id let import_events.py reload an export (even "All Sites") as-is
+    writer = csv.DictWriter(output, fieldnames=["id","site_id","event_type","page","referrer","element","text","href","timestamp","session_id","event_id"])
     writer.writeheader()
     for e in events:
-        writer.writerow({"id": e.id, "event_type": e.event_type, "page": e.page, "referrer": e.referrer, "element": e.element, "text": e.text, "href": e.href, "timestamp": e.timestamp.isoformat() if e.timestamp else ""})
+        writer.writerow({"id": e.id, "site_id": str(e.site_id), "event_type": e.event_type, "page": e.page, "referrer": e.referrer, "element": e.element, "text": e.text, "href": e.href, "timestamp": e.timestamp.isoformat() if e.timestamp else "", "session_id": e.session_id, "event_id": e.event_id})
 
     filename = f"events_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
     return Response(content=output.getvalue(), media_type="text/csv", headers={"Content-Disposition": f"attachment; filename={filename}"})
 
 @router.get("/export/pdf")
-def export_pdf(site_id: str = Query(None), db: Session = Depends(get_db), user = Depends(get_current_user)):
-    base_query = db.query(Event).join(Website).filter(Website.user_id == user.id)
-    if site_id:
-        base_query = base_query.filter(Event.site_id == site_id)
-
-    events = base_query.order_by(Event.timestamp.desc()).all()
+def export_pdf(site_id: str = Query(None), db: Session = Depends(get_read_db), user = Depends(get_current_user)):
+    events = _export_events(db, user, site_id)
     if not events:
         return Response(content="No events found", media_type="text/plain")
 
@@ -197,6 +442,8 @@ def export_pdf(site_id: str = Query(None), db: Session = Depends(get_db), user =
 
     html = f"<html><head><meta charset='utf-8'><style>table{{border-collapse:collapse;width:100%;table-layout:fixed;}}th,td{{border:1px solid #333;padding:4px;font-size:10pt;word-wrap:break-word;}}</style></head><body><h1>Event Export</h1><table border='1' cellspacing='0' cellpadding='4'><tr><th>id</th><th>event_type</th><th>page</th><th>referrer</th><th>element</th><th>text</th><th>href</th><th>timestamp</th></tr>{rows}</table></body></html>"
     
+    # WeasyPrint is a very heavy import and only this route needs it
+    from weasyprint import HTML
     pdf = HTML(string=html).write_pdf()
     filename = f"events_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.pdf"
     return Response(content=pdf, media_type="application/pdf", headers={"Content-Disposition": f"attachment; filename={filename}"})
@@ -210,7 +457,7 @@ class LabelUpdate(BaseModel):
     custom_text: str
 
 @router.post("/label")
-def update_label(payload: LabelUpdate, db: Session = Depends(get_db), user = Depends(get_current_user)):
+def update_label(payload: LabelUpdate, request: Request, db: Session = Depends(get_db), user = Depends(get_current_user)):
     try:
         formatted_site_id = py_UUID(payload.site_id)
     except ValueError:
@@ -233,6 +480,7 @@ def update_label(payload: LabelUpdate, db: Session = Depends(get_db), user = Dep
         db.add(label)
 
     db.commit()
+    note_write(request)
     return {"status": "ok", "custom_text": payload.custom_text}
 
 class EventMute(BaseModel):
@@ -241,7 +489,7 @@ class EventMute(BaseModel):
     original_text: str
 
 @router.post("/mute_event")
-def mute_event(payload: EventMute, db: Session = Depends(get_db), user = Depends(get_current_user)):
+def mute_event(payload: EventMute, request: Request, db: Session = Depends(get_db), user = Depends(get_current_user)):
     try:
         formatted_site_id = py_UUID(payload.site_id)
     except ValueError:
@@ -262,10 +510,11 @@ def mute_event(payload: EventMute, db: Session = Depends(get_db), user = Depends
         action = "muted"
     
     db.commit()
+    note_write(request)
     return {"status": "ok", "action": action}
 
 @router.delete("/cleanup_stale_data")
-def cleanup_stale_data(db: Session = Depends(get_db), user = Depends(get_current_user)):
+def cleanup_stale_data(request: Request, db: Session = Depends(get_db), user = Depends(get_current_user)):
     # Simple check to ensure only authenticated users run this (though admin check is better)
     valid_site_ids = [id[0] for id in db.query(Website.id).all()]
     
@@ -274,4 +523,5 @@ def cleanup_stale_data(db: Session = Depends(get_db), user = Depends(get_current
     db.query(EventLabel).filter(EventLabel.site_id.isnot(None), EventLabel.site_id.notin_(valid_site_ids)).delete(synchronize_session=False)
 
     db.commit()
+    note_write(request)
     return {"status": "ok", "message": "Cleanup complete"}
\ No newline at end of file
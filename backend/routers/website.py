@@ -1,21 +1,25 @@
 # backend/routers/website.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query
 from sqlalchemy.orm import Session  
 from sqlalchemy import func
 
-from database import get_db
+from database import get_db, note_write
 from models import Website
-from database import get_db
+from shards import assign_shard, delete_site_events
+from uuid import uuid4
 from auth import get_current_user
 
 router = APIRouter(prefix="/websites", tags=["websites"])
 
 @router.post("/register")
-def register_website(data: dict, db: Session = Depends(get_db), user = Depends(get_current_user)):
+def register_website(data: dict, request: Request, db: Session = Depends(get_db), user = Depends(get_current_user)):
     # The site ID (UUID) is now automatically generated by the Website model's default=uuid4
     
+    site_id = uuid4()
     website = Website(
+        id=site_id,
+        shard=assign_shard(site_id), # Which event database this site's events live in
         name=data.get("name"),
         domain=data.get("domain"),
         owner=user
@@ -23,6 +27,7 @@ def register_website(data: dict, db: Session = Depends(get_db), user = Depends(g
     db.add(website)
     db.commit()
     db.refresh(website) # This populates website.id with the new UUID value
+    note_write(request) # The dashboard queries the new site straight away
 
     # 🚨 FIX 1: Use the actual database ID (UUID) for the snippet and return value
     # The UUID object needs to be converted to a string for the URL
@@ -41,6 +46,7 @@ def list_websites(db: Session = Depends(get_db), user = Depends(get_current_user
 
 @router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
 def delete_website(
+    request: Request,
     # 🚨 FIX: Explicitly tell FastAPI this parameter comes from the URL query string
     identifier: str = Query(..., description="The domain or name of the website to delete"), 
     db: Session = Depends(get_db),
@@ -67,8 +73,12 @@ def delete_website(
             detail=f"Website with identifier '{identifier}' not found or you do not own it."
         )
 
-    # 2. Delete the website object
+    # 2. Delete its events from the owning shard (no cross-database cascade)
+    delete_site_events(website)
+
+    # 3. Delete the website object
     db.delete(website)
     db.commit()
+    note_write(request)
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
@@ -0,0 +1,144 @@
+# backend/sessionization.py
+
+from datetime import timedelta, timezone
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import SESSION_TIMEOUT_MINUTES
+from models import Event, VisitSession
+
+SESSION_TIMEOUT = timedelta(minutes=SESSION_TIMEOUT_MINUTES)
+
+# Attempts at opening a session before giving up on a hot visitor key
+OPEN_SESSION_ATTEMPTS = 3
+
+# Cap on the step path kept per session so a runaway tab can't grow a row forever
+MAX_SESSION_STEPS = 500
+
+
+def as_utc(dt):
+    # SQLite hands back naive datetimes, Postgres aware ones; compare them as UTC
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def page_step(page: str) -> str:
+    return f"page:{(page or '').lower()}"
+
+
+def click_step(element: str, text: str) -> str:
+    return f"click:{(element or '').lower()}:{(text or '').lower()}"
+
+
+def event_step(event: Event):
+    event_type = (event.event_type or "").lower()
+    if event_type == "page_view":
+        return page_step(event.page)
+    if event_type == "click":
+        return click_step(event.element, event.text)
+    return None
+
+
+def _open_session(db: Session, event: Event, ts):
+    """
+    Returns the visitor's session that ts belongs to, creating it if needed.
+
+    The latest session row is locked (FOR UPDATE on Postgres) so concurrent
+    events for one visitor update it one at a time. When there is no row to
+    lock yet, the unique (site_id, session_key, seq) index decides which
+    worker's insert wins; the loser rolls back its savepoint and folds its
+    event into the winner's session.
+    """
+    # Flush the event first so its own IntegrityError (a replayed event_id)
+    # surfaces to the caller instead of being mistaken for a session race
+    db.flush()
+
+    for _ in range(OPEN_SESSION_ATTEMPTS):
+        latest = (
+            db.query(VisitSession)
+            .filter(VisitSession.site_id == event.site_id, VisitSession.session_key == event.session_id)
+            .order_by(VisitSession.last_seen_at.desc())
+            .with_for_update()
+            .first()
+        )
+        if latest is not None and as_utc(latest.last_seen_at) >= ts - SESSION_TIMEOUT:
+            return latest
+
+        session = VisitSession(
+            site_id=event.site_id,
+            session_key=event.session_id,
+            seq=latest.seq + 1 if latest is not None else 0,
+            started_at=ts,
+            last_seen_at=ts,
+            page_views=0,
+            click_count=0,
+            steps=[],
+        )
+        try:
+            with db.begin_nested():
+                db.add(session)
+        except IntegrityError:
+            continue
+        return session
+
+    raise RuntimeError(f"Could not open a session for key '{event.session_id}' after {OPEN_SESSION_ATTEMPTS} attempts")
+
+
+def apply_event(db: Session, event: Event):
+    """
+    Folds a freshly ingested event into its visitor's session, opening a new
+    session when none was active within SESSION_TIMEOUT. The caller commits.
+    Events without a session key (old snippets) are not sessionized.
+    """
+    if not event.session_id:
+        return None
+
+    ts = as_utc(event.timestamp)
+    session = _open_session(db, event, ts)
+
+    event_type = (event.event_type or "").lower()
+    if event_type == "page_view":
+        session.page_views = (session.page_views or 0) + 1
+        if session.entry_page is None or ts <= as_utc(session.started_at):
+            session.entry_page = event.page
+        if ts >= as_utc(session.last_seen_at):
+            session.exit_page = event.page
+    elif event_type == "click":
+        session.click_count = (session.click_count or 0) + 1
+
+    if ts < as_utc(session.started_at):
+        session.started_at = ts
+    if ts > as_utc(session.last_seen_at):
+        session.last_seen_at = ts
+
+    step = event_step(event)
+    steps = list(session.steps or [])
+    if step and len(steps) < MAX_SESSION_STEPS:
+        # Reassign rather than append so the JSON column is flagged dirty
+        session.steps = steps + [step]
+
+    return session
+
+
+def funnel_counts(step_paths, funnel_steps):
+    """
+    Single pass over session step paths. Returns, for each funnel step, how
+    many sessions reached it having completed every earlier step in order.
+    """
+    counts = [0] * len(funnel_steps)
+    if not funnel_steps:
+        return counts
+
+    for path in step_paths:
+        reached = 0
+        for step in path or ():
+            if step == funnel_steps[reached]:
+                reached += 1
+                if reached == len(funnel_steps):
+                    break
+        for i in range(reached):
+            counts[i] += 1
+
+    return counts
@@ -0,0 +1,193 @@
+# backend/shards.py
+
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import sessionmaker
+
+from config import DATABASE_URL, EVENT_SHARDS, FANOUT_WORKERS, SHARD_MAP_TTL_SECONDS, pool_settings
+from database import IngestSessionLocal, ingest_engine, read_engine, make_engine
+from models import Event, VisitSession, Website
+
+# The primary database is always a shard, so sites created before sharding
+# (Website.shard is NULL) keep working untouched.
+PRIMARY_SHARD = "primary"
+
+# Tables that live on the shards rather than with users/websites/labels
+SHARDED_TABLES = [Event.__table__, VisitSession.__table__]
+
+
+class Shard:
+    def __init__(self, name, url, ingest_engine, read_engine):
+        self.name = name
+        self.url = url
+        self.ingest_engine = ingest_engine
+        self.read_engine = read_engine
+        self.IngestSession = sessionmaker(autocommit=False, autoflush=False, bind=ingest_engine)
+        self.ReadSession = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+
+def _parse_shard_config(value):
+    """
+    EVENT_SHARDS="shard1=postgresql://...,shard2=sqlite:///./shard2.db"
+    Returns an ordered list of (name, url) for the extra event databases.
+    """
+    shards = []
+    for entry in (value or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, sep, url = entry.partition("=")
+        if not sep or not name.strip() or not url.strip():
+            raise ValueError(f"Invalid EVENT_SHARDS entry: '{entry}'. Expected name=url.")
+        shards.append((name.strip(), url.strip()))
+    return shards
+
+
+def _build_shards():
+    shards = {
+        # The primary shard reuses the isolated ingest pool and the read replica
+        PRIMARY_SHARD: Shard(PRIMARY_SHARD, DATABASE_URL, ingest_engine, read_engine),
+    }
+    for name, url in _parse_shard_config(EVENT_SHARDS):
+        if name in shards:
+            raise ValueError(f"Duplicate shard name in EVENT_SHARDS: '{name}'")
+        # Two pools per shard so reports can't starve ingestion there either
+        shards[name] = Shard(
+            name,
+            url,
+            make_engine(url, pool_settings("SHARD_INGEST_DB_", 5, 10, 5), f"{name}-ingest"),
+            make_engine(url, pool_settings("SHARD_READ_DB_", 5, 10, 30), f"{name}-read"),
+        )
+    return shards
+
+
+SHARDS = _build_shards()
+SHARD_NAMES = list(SHARDS)
+
+# Shared by every request, so it must be at least as wide as the read pools behind
+# it; otherwise concurrent "All Sites" requests queue here with connections idle.
+_executor = ThreadPoolExecutor(
+    max_workers=FANOUT_WORKERS or sum(shard.read_engine.pool.capacity() for shard in SHARDS.values()),
+    thread_name_prefix="shard-fanout",
+)
+
+# site_id -> (shard name, time.monotonic() when cached)
+_site_shard_cache = {}
+
+
+def assign_shard(site_id):
+    """Stable placement for a new site: its UUID modulo the number of shards."""
+    return SHARD_NAMES[site_id.int % len(SHARD_NAMES)]
+
+
+def shard_name(website: Website):
+    return website.shard or PRIMARY_SHARD
+
+
+def get_shard(name):
+    shard = SHARDS.get(name or PRIMARY_SHARD)
+    if shard is None:
+        raise KeyError(f"Shard '{name}' is not configured in EVENT_SHARDS")
+    return shard
+
+
+def lookup_site_shard(site_id):
+    """
+    Returns the shard name owning site_id, or None for an unknown site.
+    Cached per worker for SHARD_MAP_TTL_SECONDS so ingestion doesn't hit the
+    primary for every event.
+    """
+    cached = _site_shard_cache.get(site_id)
+    now = time.monotonic()
+    if cached and now - cached[1] < SHARD_MAP_TTL_SECONDS:
+        return cached[0]
+
+    db = IngestSessionLocal()
+    try:
+        row = db.query(Website.id, Website.shard).filter(Website.id == site_id).first()
+    finally:
+        db.close()
+
+    if row is None:
+        _site_shard_cache.pop(site_id, None)
+        return None
+
+    name = row.shard or PRIMARY_SHARD
+    _site_shard_cache[site_id] = (name, now)
+    return name
+
+
+def forget_site(site_id):
+    _site_shard_cache.pop(site_id, None)
+
+
+@contextmanager
+def ingest_session(name):
+    db = get_shard(name).IngestSession()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def sites_by_shard(websites):
+    """Groups Website rows into {shard name: [site ids]}."""
+    grouped = {}
+    for website in websites:
+        grouped.setdefault(shard_name(website), []).append(website.id)
+    return grouped
+
+
+def fan_out(request_db, site_ids_by_shard, fn):
+    """
+    Runs fn(db, site_ids) on every listed shard concurrently, each with its
+    own read session, and returns the per-shard results in shard order.
+
+    request_db (the route's session) is closed first: the primary shard reads
+    from the same pool, and holding both connections at once lets a burst of
+    reports take the whole pool and then wait on each other until timeout.
+    Load everything needed from it beforehand; it can be queried again after.
+    """
+    request_db.close()
+
+    def run(name, site_ids):
+        db = get_shard(name).ReadSession()
+        try:
+            return fn(db, site_ids)
+        finally:
+            db.close()
+
+    items = list(site_ids_by_shard.items())
+    if len(items) == 1:
+        return [run(*items[0])]
+    # Carry the request context over so per-request SQL profiling sees shard queries
+    futures = [_executor.submit(contextvars.copy_context().run, run, name, site_ids) for name, site_ids in items]
+    return [f.result() for f in futures]
+
+
+def insert_new_events(engine):
+    """
+    INSERT into events that skips rows whose (site_id, event_id) is already
+    stored there, for copies that may overlap what a shard already has.
+    """
+    dialects = {"postgresql": postgresql, "sqlite": sqlite}
+    if engine.dialect.name not in dialects:
+        raise ValueError(f"Skipping duplicate events isn't supported on {engine.dialect.name}")
+    insert = dialects[engine.dialect.name].insert(Event.__table__)
+    return insert.on_conflict_do_nothing(index_elements=["site_id", "event_id"])
+
+
+def delete_site_events(website: Website):
+    """Sharded rows have no cross-database FK cascade, so delete them explicitly."""
+    db = get_shard(shard_name(website)).IngestSession()
+    try:
+        db.query(Event).filter(Event.site_id == website.id).delete(synchronize_session=False)
+        db.query(VisitSession).filter(VisitSession.site_id == website.id).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    forget_site(website.id)
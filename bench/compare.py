@@ -0,0 +1,47 @@
+# bench/compare.py
+#
+# Compares two load.py result files, e.g. before and after a change:
+#
+#   python bench/compare.py bench/results/abc1234.json bench/results/def5678.json
+
+import argparse
+import json
+
+METRICS = ["throughput_rps", "p50_ms", "p95_ms", "p99_ms"]
+
+
+def change(before, after):
+    if before in (None, 0) or after is None:
+        return "     -"
+    return f"{(after - before) / before * 100:+6.1f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline  {baseline['meta']['commit']}  ({baseline['meta']['recorded_at']})")
+    print(f"candidate {candidate['meta']['commit']}  ({candidate['meta']['recorded_at']})")
+    print()
+    print(f"{'endpoint':<12} " + " ".join(f"{m:>26}" for m in METRICS))
+
+    for name in sorted(set(baseline["endpoints"]) | set(candidate["endpoints"])):
+        b = baseline["endpoints"].get(name, {})
+        c = candidate["endpoints"].get(name, {})
+        cells = []
+        for m in METRICS:
+            bv, cv = b.get(m), c.get(m)
+            values = f"{bv if bv is not None else '-'} -> {cv if cv is not None else '-'}"
+            cells.append(f"{values:>18} {change(bv, cv)}")
+        print(f"{name:<12} " + " ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+# bench/load.py
+#
+# Concurrent load generator for a running Glassboard server. Drives /track/,
+# /stats, the exports and the snippet endpoint with a weighted request mix and
+# reports throughput and p50/p95/p99 latency per endpoint.
+#
+#   uvicorn main:app --port 8000            (from backend/, against the seeded DB)
+#   python bench/load.py --duration 60 --concurrency 32
+#
+# Results are saved as JSON (bench/results/<commit>.json by default) so runs can
+# be diffed between commits with bench/compare.py. Only the standard library is
+# used so the harness adds nothing to the server's requirements.
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_PATH = os.path.join(BENCH_DIR, "seed_manifest.json")
+
+# name -> default share of requests. Ingestion dominates real traffic.
+DEFAULT_MIX = {
+    "track": 80,
+    "stats_all": 6,
+    "stats_site": 6,
+    "stats_compact": 0,  # /stats?format=compact, opt in with --mix
+    "stats_overview": 0,  # /stats/overview, opt in with --mix
+    "snippet": 6,
+    "export_csv": 1,
+    "export_pdf": 1,
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Client:
+    """One keep-alive connection per worker thread."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.conn = conn_cls(parts.hostname, parts.port, timeout=timeout)
+        self.cookie = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            res = self.conn.getresponse()
+            data = res.read()
+        except (http.client.HTTPException, OSError):
+            # Reconnect on the next request
+            self.conn.close()
+            raise
+        return res, data
+
+    def login(self, username, password):
+        res, _ = self.request(
+            "POST", "/login",
+            body=urlencode({"username": username, "password": password}),
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        for header, value in res.getheaders():
+            if header.lower() == "set-cookie" and value.startswith("session_token="):
+                self.cookie = value.split(";", 1)[0]
+                return
+        raise RuntimeError(f"Login failed for {username} (status {res.status})")
+
+
+def make_request(name, rng, account):
+    """Returns (method, path, body, headers) for one request of the given kind."""
+    site_id = rng.choice(account["site_ids"])
+    if name == "track":
+        payload = {
+            "site_id": site_id,
+            "event_type": "click" if rng.random() < 0.3 else "page_view",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "page": f"/bench-{rng.randrange(50)}",
+            "referrer": rng.choice([None, "https://www.google.com/search?q=bench", "https://t.co/x"]),
+            "element": "button",
+            "text": f"Bench {rng.randrange(30)}",
+            "session_id": f"bench-{rng.randrange(100000)}",
+        }
+        return "POST", "/track/", json.dumps(payload), {"Content-Type": "application/json"}
+    if name == "stats_all":
+        return "GET", "/stats", None, None
+    if name == "stats_site":
+        return "GET", f"/stats?site_id={site_id}", None, None
+    if name == "stats_overview":
+        return "GET", "/stats/overview", None, None
+    if name == "stats_compact":
+        return "GET", f"/stats?site_id={site_id}&format=compact", None, {"Accept-Encoding": "gzip"}
+    if name == "snippet":
+        return "GET", f"/snippet/{site_id}.js", None, None
+    if name == "export_csv":
+        return "GET", f"/stats/export/csv?site_id={site_id}", None, None
+    if name == "export_pdf":
+        return "GET", f"/stats/export/pdf?site_id={site_id}", None, None
+    raise ValueError(f"Unknown endpoint '{name}'")
+
+
+def worker(worker_id, args, manifest, mix, deadline, results, lock):
+    rng = random.Random(args.seed + worker_id)
+    account = manifest["users"][worker_id % len(manifest["users"])]
+    client = Client(args.base_url, args.timeout)
+    client.login(account["username"], manifest["password"])
+
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    local = {n: {"latencies": [], "errors": 0} for n in names}
+
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights=weights)[0]
+        method, path, body, headers = make_request(name, rng, account)
+        started = time.perf_counter()
+        try:
+            res, _ = client.request(method, path, body, headers)
+            ok = res.status < 400
+        except (http.client.HTTPException, OSError):
+            ok = False
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+
+        if ok:
+            local[name]["latencies"].append(elapsed_ms)
+        else:
+            local[name]["errors"] += 1
+
+    with lock:
+        for name, stats in local.items():
+            results[name]["latencies"].extend(stats["latencies"])
+            results[name]["errors"] += stats["errors"]
+
+
+def parse_mix(value):
+    if not value:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for entry in value.split(","):
+        name, _, weight = entry.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(DEFAULT_MIX)
+    if unknown:
+        raise SystemExit(f"Unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+    return {n: w for n, w in mix.items() if w > 0}
+
+
+def summarize(results, duration):
+    summary = {}
+    for name, stats in results.items():
+        latencies = sorted(stats["latencies"])
+        count = len(latencies)
+        summary[name] = {
+            "requests": count,
+            "errors": stats["errors"],
+            "throughput_rps": round(count / duration, 2),
+            "mean_ms": round(sum(latencies) / count, 2) if count else None,
+            "p50_ms": round(percentile(latencies, 50), 2) if count else None,
+            "p95_ms": round(percentile(latencies, 95), 2) if count else None,
+            "p99_ms": round(percentile(latencies, 99), 2) if count else None,
+            "max_ms": round(latencies[-1], 2) if count else None,
+        }
+    return summary
+
+
+def print_table(summary):
+    print(f"{'endpoint':<12} {'reqs':>8} {'errs':>6} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, s in summary.items():
+        fmt = lambda v: f"{v:9.2f}" if v is not None else f"{'-':>9}"
+        print(f"{name:<12} {s['requests']:>8} {s['errors']:>6} {s['throughput_rps']:>9.2f} {fmt(s['p50_ms'])} {fmt(s['p95_ms'])} {fmt(s['p99_ms'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive a running Glassboard server and record latency percentiles.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of unmeasured load first")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", help="weights, e.g. track=80,stats_all=10,snippet=10 (default: %s)" % ",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()))
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--out", help="result JSON path (default: bench/results/<commit>.json)")
+    args = parser.parse_args(argv)
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    mix = parse_mix(args.mix)
+
+    def run(duration):
+        results = {n: {"latencies": [], "errors": 0} for n in mix}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(worker, i, args, manifest, mix, deadline, results, lock) for i in range(args.concurrency)]
+            for f in futures:
+                f.result()
+        return results
+
+    if args.warmup > 0:
+        print(f"Warming up for {args.warmup:.0f}s...")
+        run(args.warmup)
+
+    print(f"Measuring for {args.duration:.0f}s with {args.concurrency} workers...")
+    started = time.perf_counter()
+    results = run(args.duration)
+    summary = summarize(results, time.perf_counter() - started)
+    print_table(summary)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "base_url": args.base_url,
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+            "mix": mix,
+            "seeded_events": manifest.get("events"),
+        },
+        "endpoints": summary,
+    }
+
+    out = args.out or os.path.join(BENCH_DIR, "results", f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# bench/seed.py
+#
+# Seeds the database pointed to by DATABASE_URL (and any EVENT_SHARDS) with
+# synthetic users, websites, labels, mutes and events for benchmarking.
+#
+#   DATABASE_URL=sqlite:///./bench.db python bench/seed.py --events 1000000
+#
+# Writes bench/seed_manifest.json with the logins and site ids load.py drives.
+#
+# Distributions are skewed like real traffic: a few tenants own most events,
+# pages and buttons follow a Zipf curve, visits cluster in daytime hours and
+# most referrers are direct or search.
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "backend"))
+
+from passlib.context import CryptContext
+from sqlalchemy.engine import make_url
+
+from database import SessionLocal
+from models import Event, EventLabel, IgnoredEvent, User, Website
+from referrers import normalize_referrer
+from shards import SHARDS, assign_shard, get_shard
+
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "seed_manifest.json")
+BENCH_PASSWORD = "bench-password"
+
+REFERRERS = [
+    (None, 40),
+    ("https://www.google.com/search?q={q}", 30),
+    ("https://www.bing.com/search?q={q}", 5),
+    ("https://duckduckgo.com/?q={q}", 3),
+    ("https://l.facebook.com/l.php?u=x&h={q}", 6),
+    ("https://t.co/{q}", 4),
+    ("https://www.linkedin.com/feed/?trk={q}", 3),
+    ("https://news.ycombinator.com/item?id={q}", 2),
+    ("https://blog{n}.example.org/post/{q}", 7),
+]
+
+ELEMENT_TEXTS = ["Sign up", "Buy now", "Learn more", "Contact", "Pricing", "Get started", "Download", "Subscribe", "Log in", "Read more"]
+
+# Visits per hour of day (UTC), roughly a business-day curve
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 3, 5, 7, 8, 9, 9, 9, 9, 8, 8, 7, 6, 5, 4, 3, 2, 2, 1]
+
+
+def random_uuid(rng):
+    # Drawn from the seeded generator so the same --seed gives the same site ids
+    return UUID(int=rng.getrandbits(128), version=4)
+
+
+def zipf_weights(n, s=1.1):
+    return [1.0 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def site_catalog(rng, site_index):
+    pages = ["/"] + [f"/page-{site_index}-{i}" for i in range(1, 50)]
+    elements = []
+    for i in range(30):
+        tag = "button" if i % 3 else "a"
+        elements.append((tag, f"{rng.choice(ELEMENT_TEXTS)} {i}"))
+    return pages, elements
+
+
+def seed_accounts(db, rng, users, sites_per_user, password_hash):
+    """Creates users and websites. Returns [(user, [website, ...])]."""
+    accounts = []
+    for u in range(users):
+        user = User(username=f"bench_user_{u}", password_hash=password_hash)
+        db.add(user)
+        db.flush()
+
+        websites = []
+        for s in range(sites_per_user):
+            site_id = random_uuid(rng)
+            website = Website(
+                id=site_id,
+                shard=assign_shard(site_id),
+                name=f"Bench Site {u}-{s}",
+                domain=f"site-{u}-{s}.example.com",
+                user_id=user.id,
+                created_at=datetime.now(timezone.utc) - timedelta(days=400),
+            )
+            db.add(website)
+            websites.append(website)
+        accounts.append((user, websites))
+    db.commit()
+    return accounts
+
+
+def seed_labels_and_mutes(db, websites, catalogs):
+    for website in websites:
+        _, elements = catalogs[website.id]
+        for tag, text in elements[:3]:
+            db.add(EventLabel(site_id=website.id, element=tag, original_text=text, custom_text=f"{text} (renamed)"))
+        tag, text = elements[-1]
+        db.add(IgnoredEvent(site_id=website.id, element=tag, original_text=text))
+    db.commit()
+
+
+def generate_events(rng, website, catalog, count, now, referrer_cache):
+    pages, elements = catalog
+    page_weights = zipf_weights(len(pages))
+    element_weights = zipf_weights(len(elements))
+
+    session_id = None
+    session_left = 0
+    for _ in range(count):
+        # Visitors produce a handful of events per session
+        if session_left <= 0:
+            session_id = random_uuid(rng).hex
+            session_left = rng.randint(1, 12)
+        session_left -= 1
+
+        day = int(rng.triangular(0, 365, 0))  # recent days are busier
+        hour = rng.choices(range(24), weights=HOUR_WEIGHTS)[0]
+        ts = (now - timedelta(days=day)).replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60))
+
+        template = rng.choices([r[0] for r in REFERRERS], weights=[r[1] for r in REFERRERS])[0]
+        referrer = template.format(q=rng.randrange(1000), n=rng.randrange(20)) if template else None
+        if referrer not in referrer_cache:
+            referrer_cache[referrer] = normalize_referrer(referrer)
+        referrer_host, referrer_source = referrer_cache[referrer]
+
+        page = rng.choices(pages, weights=page_weights)[0]
+        if rng.random() < 0.7:
+            event_type, element, text = "page_view", None, None
+        else:
+            event_type = "click"
+            element, text = rng.choices(elements, weights=element_weights)[0]
+
+        yield {
+            "site_id": website.id,
+            "page": page,
+            "element": element,
+            "text": text,
+            "href": None,
+            "event_type": event_type,
+            "timestamp": ts,
+            "referrer": referrer,
+            "referrer_host": referrer_host,
+            "referrer_source": referrer_source,
+            "session_id": session_id,
+        }
+
+
+def insert_events(website, rows, batch_size):
+    shard_engine = get_shard(website.shard).ingest_engine
+    batch = []
+    inserted = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            with shard_engine.begin() as conn:
+                conn.execute(Event.__table__.insert(), batch)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        with shard_engine.begin() as conn:
+            conn.execute(Event.__table__.insert(), batch)
+        inserted += len(batch)
+    return inserted
+
+
+def migrate(url):
+    """Brings one database to the Alembic head, the same way a deploy does."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database and not os.path.isabs(url.database):
+        # alembic runs from the repo root; keep relative SQLite paths pointing where we do
+        url = url.set(database=os.path.abspath(url.database))
+    env = dict(os.environ, DATABASE_URL=url.render_as_string(hide_password=False))
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=REPO_DIR, env=env, check=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed a local database with synthetic Glassboard data.")
+    parser.add_argument("--events", type=int, default=1_000_000, help="total events across all sites")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--sites-per-user", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42, help="random seed, for reproducible datasets")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+
+    # Schema comes from the migrations (primary and every shard), so the seeded
+    # databases stay upgradable with `alembic upgrade head` afterwards
+    for shard in SHARDS.values():
+        migrate(shard.url)
+
+    db = SessionLocal()
+    try:
+        if db.query(User).filter(User.username == "bench_user_0").first():
+            raise SystemExit("Database is already seeded; point DATABASE_URL at a fresh database.")
+
+        password_hash = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(BENCH_PASSWORD)
+        accounts = seed_accounts(db, rng, args.users, args.sites_per_user, password_hash)
+        websites = [w for _, sites in accounts for w in sites]
+
+        catalogs = {w.id: site_catalog(rng, i) for i, w in enumerate(websites)}
+        seed_labels_and_mutes(db, websites, catalogs)
+
+        # A few large tenants own most of the traffic
+        weights = zipf_weights(len(websites), s=1.2)
+        rng.shuffle(weights)
+        total_weight = sum(weights)
+        per_site = [int(args.events * w / total_weight) for w in weights]
+        per_site[0] += args.events - sum(per_site)
+
+        now = datetime.now(timezone.utc)
+        referrer_cache = {}
+        inserted = 0
+        for website, count in zip(websites, per_site):
+            inserted += insert_events(
+                website,
+                generate_events(rng, website, catalogs[website.id], count, now, referrer_cache),
+                args.batch_size,
+            )
+            elapsed = time.perf_counter() - started
+            print(f"{inserted:>12,} / {args.events:,} events  ({inserted / elapsed:,.0f} rows/s)")
+
+        manifest = {
+            "events": inserted,
+            "password": BENCH_PASSWORD,
+            "users": [
+                {"username": user.username, "site_ids": [str(w.id) for w in sites]}
+                for user, sites in accounts
+            ],
+            "seed": args.seed,
+            "created_at": now.isoformat(),
+        }
+    finally:
+        db.close()
+
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"Seeded {inserted:,} events in {time.perf_counter() - started:.1f}s; manifest at {MANIFEST_PATH}")
+
+
+if __name__ == "__main__":
+    main()
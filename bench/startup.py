@@ -0,0 +1,74 @@
+# bench/startup.py
+#
+# Startup-time budget check. Boots the app the way a worker does (importing
+# backend/main.py in a fresh interpreter) several times and fails if the
+# median import time exceeds the budget, or if a heavy optional dependency is
+# imported at boot instead of on first use.
+#
+#   python bench/startup.py                  # default budget
+#   python bench/startup.py --budget 0.8     # seconds
+#
+# Exits non-zero on regression so it can gate CI or a pre-deploy hook.
+# Needs a DATABASE_URL, but never connects to it: importing main must not touch the database.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+# Modules that must only be imported by the routes that need them
+LAZY_MODULES = ["weasyprint"]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def boot_once():
+    env = dict(os.environ)
+    # A database that doesn't exist proves boot doesn't connect anywhere
+    env.setdefault("DATABASE_URL", "postgresql+psycopg2://startup-check@127.0.0.1:1/none")
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail if app boot time regresses past a budget.")
+    parser.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET_SECONDS", "1.5")),
+                        help="max median seconds to import main (default 1.5, or STARTUP_BUDGET_SECONDS)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    runs = [boot_once() for _ in range(args.runs)]
+    times = [r["seconds"] for r in runs]
+    median = statistics.median(times)
+    eager = sorted({m for r in runs for m in r["loaded"]})
+
+    print(f"import main: median {median * 1000:.0f} ms, min {min(times) * 1000:.0f} ms, max {max(times) * 1000:.0f} ms "
+          f"over {args.runs} runs (budget {args.budget * 1000:.0f} ms)")
+
+    failed = False
+    if eager:
+        print(f"FAIL: imported at boot but should be lazy: {', '.join(eager)}")
+        failed = True
+    if median > args.budget:
+        print("FAIL: startup time is over budget")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
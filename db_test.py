@@ -1,6 +1,10 @@
 from sqlalchemy import create_engine, text
 import psycopg2
-from backend.database import DATABASE_URL
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from config import DATABASE_URL
 
 engine = create_engine(DATABASE_URL)
 
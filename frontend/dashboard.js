@@ -29,8 +29,8 @@ async function ensureLoggedIn() {
 function updateDashboard() {
     const siteId = document.getElementById("siteSelect").value;
     const url = siteId
-        ? `/stats?site_id=${siteId}`
-        : `/stats`;
+        ? `/stats?format=compact&site_id=${siteId}`
+        : `/stats?format=compact`;
 
     fetch(url)
         .then(res => {
@@ -40,6 +40,7 @@ function updateDashboard() {
             }
             return res.json();
         })
+        .then(decodeCompactStats)
         .then(data => {
             
             // --- 1. CORE DATA ASSIGNMENT (Clean Data Flow) ---
@@ -72,14 +73,36 @@ function updateDashboard() {
             // The chart rendering functions handle any necessary local label overrides.
             renderFilteredChart(document.getElementById("summaryRange").value);
             
-            // Assuming this function exists to show referrer list
-            renderReferrers(data.all_visits); // Use all_visits or all_clicks data for referrer list
+            // Referrer and page breakdowns are aggregated server-side
+            renderReferrers(siteId);
+            renderTopPages(siteId);
+            renderOverview(siteId);
             renderAllEvents(data.all_clicks, data.all_visits); // ADD THIS LINE
             
         })
         .catch(err => console.error("Error loading stats:", err));
 }
 
+/**
+ * Turns a ?format=compact /stats payload back into the row shape the rest of
+ * the dashboard uses. Strings arrive as indexes into data.strings and
+ * timestamps as epoch milliseconds. Plain payloads pass through untouched.
+ */
+function decodeCompactStats(data) {
+    if (!data || data.format !== "compact") return data;
+
+    const strings = data.strings;
+    const toRows = (columns) => columns.timestamp.map((ts, i) => {
+        const row = { timestamp: ts === null ? null : new Date(ts).toISOString() };
+        for (const [name, values] of Object.entries(columns)) {
+            if (name !== "timestamp") row[name] = values[i] === null ? null : strings[values[i]];
+        }
+        return row;
+    });
+
+    return { ...data, all_clicks: toRows(data.all_clicks), all_visits: toRows(data.all_visits) };
+}
+
 function renderFilteredChart(range) {
     const now = new Date();
     const filtered = allSummaryData
@@ -238,26 +261,98 @@ async function loadWebsites() {
     }
 }
 
-function renderReferrers(events) {
+/**
+ * Fetches the top referrer sources (normalized at ingest) for the selected site.
+ * @param {string} siteId - Selected site, or empty string for All Sites
+ */
+async function renderReferrers(siteId) {
     const refList = document.getElementById("referrerList");
-    refList.innerHTML = "";
+    const url = siteId
+        ? `/stats/referrers?limit=5&site_id=${siteId}`
+        : `/stats/referrers?limit=5`;
 
-    const counts = {};
+    try {
+        const res = await fetch(url, { credentials: "include" });
+        if (!res.ok) throw new Error(`Referrers API returned status: ${res.status}`);
+        const data = await res.json();
+
+        refList.innerHTML = "";
+        data.referrers.forEach(({ source, visits }) => {
+            const li = document.createElement("li");
+            li.textContent = `${source}: ${visits}`;
+            refList.appendChild(li);
+        });
+    } catch (err) {
+        console.error("Error loading referrers:", err);
+    }
+}
 
-    events.forEach(ev => {
-        if (!ev.referrer) return;
-        counts[ev.referrer] = (counts[ev.referrer] || 0) + 1;
-    });
+/**
+ * Fetches the most visited pages for the selected site.
+ * @param {string} siteId - Selected site, or empty string for All Sites
+ */
+async function renderTopPages(siteId) {
+    const pageList = document.getElementById("pageList");
+    if (!pageList) return;
 
-    const sorted = Object.entries(counts)
-        .sort((a, b) => b[1] - a[1])
-        .slice(0, 5);
+    const url = siteId
+        ? `/stats/pages?limit=5&site_id=${siteId}`
+        : `/stats/pages?limit=5`;
 
-    sorted.forEach(([ref, count]) => {
-        const li = document.createElement("li");
-        li.textContent = `${ref}: ${count}`;
-        refList.appendChild(li);
-    });
+    try {
+        const res = await fetch(url, { credentials: "include" });
+        if (!res.ok) throw new Error(`Pages API returned status: ${res.status}`);
+        const data = await res.json();
+
+        pageList.innerHTML = "";
+        data.pages.forEach(({ page, visits }) => {
+            const li = document.createElement("li");
+            li.textContent = `${page}: ${visits}`;
+            pageList.appendChild(li);
+        });
+    } catch (err) {
+        console.error("Error loading top pages:", err);
+    }
+}
+
+
+/**
+ * Fills the per-site comparison table for "All Sites" from one /stats/overview call.
+ * @param {string} siteId - Selected site; the table is hidden when one is selected
+ */
+async function renderOverview(siteId) {
+    const card = document.getElementById("overviewCard");
+    if (!card) return;
+    card.style.display = siteId ? "none" : "";
+    if (siteId) return;
+
+    try {
+        const res = await fetch("/stats/overview?top=1", { credentials: "include" });
+        if (!res.ok) throw new Error(`Overview API returned status: ${res.status}`);
+        const data = await res.json();
+
+        const body = card.querySelector("tbody");
+        body.innerHTML = "";
+        data.sites.forEach(site => {
+            const top = site.top_elements[0];
+            const cells = [
+                site.name || site.domain,
+                site.month_clicks.toLocaleString(),
+                site.month_visits.toLocaleString(),
+                site.total_visits.toLocaleString(),
+                top ? `${top.text} <${top.element}> (${top.count})` : "-",
+            ];
+            const tr = document.createElement("tr");
+            cells.forEach(value => {
+                const td = document.createElement("td");
+                td.textContent = value;
+                tr.appendChild(td);
+            });
+            body.appendChild(tr);
+        });
+    } catch (err) {
+        console.error("Error loading sites overview:", err);
+    }
 }
 
 
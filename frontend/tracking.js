@@ -14,6 +14,29 @@
         return; 
     }
 
+    const MAX_RETRIES = 2;
+
+    function newId() {
+        return (window.crypto && crypto.randomUUID)
+            ? crypto.randomUUID()
+            : Date.now().toString(36) + Math.random().toString(36).slice(2);
+    }
+
+    // One session key per tab; the backend splits it on inactivity
+    const SESSION_KEY = 'glassboard_session_id';
+    function getSessionId() {
+        try {
+            let sid = sessionStorage.getItem(SESSION_KEY);
+            if (!sid) {
+                sid = newId();
+                sessionStorage.setItem(SESSION_KEY, sid);
+            }
+            return sid;
+        } catch (e) {
+            return null;
+        }
+    }
+
     // 2. CORE EVENT SENDER
     // Now takes the eventType and element details (which will be null for page_view)
     function sendEvent(eventType, elementDetails = {}) {
@@ -26,17 +49,34 @@
             element: elementDetails.element || null,
             text: elementDetails.text || null,
             href: elementDetails.href || null,
+            session_id: getSessionId(),
+            // Same id on every retry, so the backend stores the event once
+            event_id: newId(),
         };
 
         console.log("Tracking payload:", payload); // <-- Add this line
 
+        post(payload, 0);
+    }
+
+    function post(payload, attempt) {
         fetch(`${BACKEND_URL}/track`, {
             method: "POST",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify(payload)
+            body: JSON.stringify(payload),
+            keepalive: true
+        })
+        .then(res => {
+            if (res.status >= 500) throw new Error(`HTTP ${res.status}`);
+            return res.json();
         })
-        .then(res => res.json())
-        .catch(err => console.error("Glassboard Tracking failed:", err));
+        .catch(err => {
+            if (attempt < MAX_RETRIES) {
+                setTimeout(() => post(payload, attempt + 1), 1000 * 2 ** attempt);
+            } else {
+                console.error("Glassboard Tracking failed:", err);
+            }
+        });
     }
 
 